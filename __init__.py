@@ -1,10 +1,23 @@
-from .lib.node.const import *
-from .lib.node.format import *
-from .lib.node.preset import *
-from .lib.node.weight import *
-from .lib.custom_server import *
-from .lib.node.file_io import *
-from .lib.preset import PresetManager
+from .lib.node.const import PromptHelper_String, PromptHelper_StringMultiLine
+from .lib.node.format import (
+    PromptHelper_EncodeMultiStringCombine,
+    PromptHelper_TokenBudgetPrompt,
+    PromptHelper_ConcatString,
+    PromptHelper_ConcatConditioning,
+    PromptHelper_CombineConditioning,
+    PromptHelper_FormatString,
+)
+from .lib.node.preset import (
+    PromptHelper_LoadPreset,
+    PromptHelper_LoadPresetAdvanced,
+    PromptHelper_RandomPreset,
+    PromptHelper_RandomPresetAdvanced,
+)
+from .lib.node.weight import PromptHelper_WeightedPrompt
+from .lib.node.file_io import PromptHelper_LoadImageBatchFromDir, PromptHelper_LoadImageListFromDir, PromptHelper_SaveImageToDir
+
+# registers the server routes and the on-prompt handler
+from .lib import custom_server
 
 NODE_CLASS_MAPPINGS = {
     "PromptHelper_String": PromptHelper_String,
@@ -12,7 +25,10 @@ NODE_CLASS_MAPPINGS = {
     "PromptHelper_WeightedPrompt": PromptHelper_WeightedPrompt,
     "PromptHelper_LoadPreset": PromptHelper_LoadPreset,
     "PromptHelper_LoadPresetAdvanced": PromptHelper_LoadPresetAdvanced,
+    "PromptHelper_RandomPreset": PromptHelper_RandomPreset,
+    "PromptHelper_RandomPresetAdvanced": PromptHelper_RandomPresetAdvanced,
     "PromptHelper_EncodeMultiStringCombine": PromptHelper_EncodeMultiStringCombine,
+    "PromptHelper_TokenBudgetPrompt": PromptHelper_TokenBudgetPrompt,
     "PromptHelper_ConcatString": PromptHelper_ConcatString,
     "PromptHelper_ConcatConditioning": PromptHelper_ConcatConditioning,
     "PromptHelper_CombineConditioning": PromptHelper_CombineConditioning,
@@ -28,7 +44,10 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "PromptHelper_WeightedPrompt": "Weighted Prompt",
     "PromptHelper_LoadPreset": "Load Preset",
     "PromptHelper_LoadPresetAdvanced": "Load Preset (Advanced)",
+    "PromptHelper_RandomPreset": "Random Preset",
+    "PromptHelper_RandomPresetAdvanced": "Random Preset (Advanced)",
     "PromptHelper_EncodeMultiStringCombine": "Encode (multi-str)",
+    "PromptHelper_TokenBudgetPrompt": "Token Budget (str)",
     "PromptHelper_ConcatString": "Concat (str)",
     "PromptHelper_ConcatConditioning": "Concat (cond)",
     "PromptHelper_CombineConditioning": "Combine (cond)",
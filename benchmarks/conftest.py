@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+# the stand-in comfyui modules and the repository root (for `lib.*`) go first on the path
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCHMARKS_DIR, "stubs"), os.path.dirname(BENCHMARKS_DIR)]
+
+import folder_paths  # noqa: E402
+from fake_clip import FakeClip  # noqa: E402
+from lib.image_cache import ImageCache  # noqa: E402
+from lib.node.file_io import DirectoryListing  # noqa: E402
+from lib.preset import PresetManager, PresetManagerAdvanced  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption("--large", action="store_true", help="also run the million-row csv and 100k-file folder cases")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "large: slow cases that only run with --large")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--large"):
+        return
+    skip = pytest.mark.skip(reason="needs --large")
+    for item in items:
+        if "large" in item.keywords:
+            item.add_marker(skip)
+
+
+def reset_preset_manager(manager):
+    manager.custom_nodes_dir = None
+    manager._presets = None
+    manager._files = None
+    manager._search_index = None
+    manager._group_index = None
+    manager._fingerprints = None
+
+
+@pytest.fixture
+def custom_nodes_dir(tmp_path):
+    # a fresh comfyui `custom_nodes` directory with an empty presets folder for both managers
+    root = tmp_path / "custom_nodes"
+    (root / "ComfyUI-Prompt-Helper" / "presets").mkdir(parents=True)
+    folder_paths.set_folder_paths("custom_nodes", [str(root)])
+    for manager in [PresetManager, PresetManagerAdvanced]:
+        reset_preset_manager(manager)
+    ImageCache.custom_nodes_dir = None
+    ImageCache._entries = None
+    ImageCache._total_bytes = 0
+    DirectoryListing._cache.clear()
+    yield root
+    for manager in [PresetManager, PresetManagerAdvanced]:
+        reset_preset_manager(manager)
+    ImageCache.custom_nodes_dir = None
+    ImageCache._entries = None
+
+
+@pytest.fixture
+def presets_dir(custom_nodes_dir):
+    return custom_nodes_dir / "ComfyUI-Prompt-Helper" / "presets"
+
+
+@pytest.fixture
+def fake_clip():
+    return FakeClip()
@@ -0,0 +1,58 @@
+# fake CLIP with the tokenizer chunking rules of comfyui `SDTokenizer`, so token counts and chunk boundaries
+# behave like SD1.x without loading a model. every run of up to 4 letters or digits and every other symbol is one token
+import re
+import zlib
+
+import torch
+
+REGEX_FAKE_TOKEN = re.compile(r"[A-Za-z0-9]{1,4}|[^\sA-Za-z0-9]")
+
+
+class FakeTokenizer:
+    max_length = 77
+    # words of at least this many tokens are split across chunks, shorter ones move to the next chunk as a whole
+    large_word = 8
+
+    def tokenize_with_weights(self, text: str, return_word_ids=False):
+        chunk = self.max_length - 2
+        batches = [[]]
+        for word_id, word in enumerate(text.split(), 1):
+            tokens = [(zlib.crc32(t.encode()) & 0xFFFF, 1.0, word_id) for t in REGEX_FAKE_TOKEN.findall(word)]
+            while tokens:
+                space = chunk - len(batches[-1])
+                if len(tokens) > space:
+                    if len(tokens) >= self.large_word and space > 0:
+                        batches[-1] += tokens[:space]
+                        tokens = tokens[space:]
+                    batches.append([])
+                    continue
+                batches[-1] += tokens
+                tokens = []
+
+        start, end = (49406, 1.0, 0), (49407, 1.0, 0)
+        result = []
+        for batch in batches:
+            batch = [start, *batch, end]
+            batch += [end] * (self.max_length - len(batch))
+            result.append(batch if return_word_ids else [token[:2] for token in batch])
+        return {"l": result}
+
+
+class FakeClip:
+    width = 768
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.encode_count = 0
+
+    def tokenize(self, text: str, return_word_ids=False):
+        return self.tokenizer.tokenize_with_weights(text, return_word_ids)
+
+    def encode_from_tokens_scheduled(self, tokens):
+        # deterministic random conditioning, (1, 77 * chunks, width) plus a pooled output like a real clip
+        self.encode_count += 1
+        batches = tokens["l"]
+        generator = torch.Generator().manual_seed(zlib.crc32(repr(batches).encode()))
+        cond = torch.randn((1, len(batches) * self.tokenizer.max_length, self.width), generator=generator)
+        pooled = torch.randn((1, self.width), generator=generator)
+        return [[cond, {"pooled_output": pooled}]]
@@ -0,0 +1,88 @@
+# `python -X importtime` of the package as comfyui loads a custom node, against the stubs. the heavy dependencies
+# (torch, numpy, pillow, yaml, aiohttp) are imported first as comfyui has them loaded already, so only this package's
+# own cost is reported. pass another checkout to compare, e.g. a `git worktree` of an older commit:
+#
+#   python benchmarks/importtime.py                  # this checkout
+#   python benchmarks/importtime.py /tmp/old --runs 9 --loras 5000
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_NAME = "prompt_helper"
+REGEX_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+CHILD_SCRIPT = """
+import importlib.util
+import os
+import sys
+
+sys.path.insert(0, {stubs!r})
+import aiohttp.web, numpy, PIL.Image, PIL.PngImagePlugin, torch, yaml
+import folder_paths, server
+
+folder_paths.set_folder_paths("custom_nodes", [{custom_nodes!r}])
+folder_paths.set_folder_paths("loras", [{loras!r}])
+# same as comfyui `load_custom_node`
+spec = importlib.util.spec_from_file_location({name!r}, os.path.join({package!r}, "__init__.py"), submodule_search_locations=[{package!r}])
+module = importlib.util.module_from_spec(spec)
+sys.modules[{name!r}] = module
+spec.loader.exec_module(module)
+"""
+
+
+def write_loras(directory: str, count: int):
+    for i in range(count):
+        subdir = os.path.join(directory, f"set{i % 20}")
+        os.makedirs(subdir, exist_ok=True)
+        open(os.path.join(subdir, f"lora_{i}.safetensors"), "w").close()
+
+
+def measure(package_dir: str, loras_dir: str, custom_nodes_dir: str) -> dict[str, tuple[int, int]]:
+    # module -> (self us, cumulative us) of one fresh interpreter, only modules of this package
+    script = CHILD_SCRIPT.format(stubs=os.path.join(BENCHMARKS_DIR, "stubs"), custom_nodes=custom_nodes_dir, loras=loras_dir, name=PACKAGE_NAME, package=package_dir)
+    # bytecode is written even under PYTHONDONTWRITEBYTECODE, otherwise every run would measure compiling
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True, check=True, env=env)
+    modules = dict()
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = REGEX_IMPORTTIME.match(line)
+        if match and match[4].startswith(f"{PACKAGE_NAME}."):
+            modules[match[4]] = (int(match[1]), int(match[2]))
+            top_level.append((len(match[3]), int(match[2])))
+    # `exec_module` of the package itself is not logged, its total is the sum of the outermost submodule imports
+    indent = min(i for i, _ in top_level)
+    modules[PACKAGE_NAME] = (0, sum(us for i, us in top_level if i == indent))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="python -X importtime of this package against the benchmark stubs")
+    parser.add_argument("package_dir", nargs="?", default=os.path.dirname(BENCHMARKS_DIR))
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--loras", type=int, default=2000, help="number of lora files in the stub loras folder")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        loras_dir = os.path.join(temp_dir, "loras")
+        custom_nodes_dir = os.path.join(temp_dir, "custom_nodes")
+        write_loras(loras_dir, args.loras)
+        os.makedirs(os.path.join(custom_nodes_dir, "ComfyUI-Prompt-Helper", "presets"))
+        # the first run writes the bytecode caches and is not counted
+        measure(args.package_dir, loras_dir, custom_nodes_dir)
+        runs = [measure(args.package_dir, loras_dir, custom_nodes_dir) for _ in range(args.runs)]
+
+    print(f"{'module':<40} {'self ms':>8} {'cumulative ms':>14}  (median of {args.runs} runs)")
+    for module in runs[0]:
+        self_us = statistics.median(run[module][0] for run in runs if module in run)
+        cumulative_us = statistics.median(run[module][1] for run in runs if module in run)
+        print(f"{module:<40} {self_us / 1000:>8.1f} {cumulative_us / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
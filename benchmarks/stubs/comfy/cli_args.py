@@ -0,0 +1,4 @@
+# stand-in for comfyui `comfy.cli_args`, only the flags this package reads
+import argparse
+
+args = argparse.Namespace(disable_metadata=False)
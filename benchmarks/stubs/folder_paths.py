@@ -0,0 +1,45 @@
+# stand-in for comfyui `folder_paths`, only what this package uses.
+# point "custom_nodes" at a temporary directory with `set_folder_paths` (see conftest.py)
+import os
+
+folder_names_and_paths = {
+    "custom_nodes": ([], set()),
+    "loras": ([], {".safetensors"}),
+}
+
+
+def set_folder_paths(folder_name: str, paths: list[str]):
+    folder_names_and_paths[folder_name] = (list(paths), folder_names_and_paths.get(folder_name, ([], set()))[1])
+
+
+def get_folder_paths(folder_name: str) -> list[str]:
+    return folder_names_and_paths[folder_name][0]
+
+
+def recursive_search(directory: str, excluded_dir_names: list[str] | None = None) -> tuple[list[str], dict[str, float]]:
+    # same contract as comfyui: file paths relative to `directory` and the mtime of every visited directory
+    if not os.path.isdir(directory):
+        return [], dict()
+    excluded_dir_names = excluded_dir_names or []
+    result = []
+    dirs = {directory: os.path.getmtime(directory)}
+    for dirpath, subdirs, filenames in os.walk(directory, followlinks=True, topdown=True):
+        subdirs[:] = [d for d in subdirs if d not in excluded_dir_names]
+        for filename in filenames:
+            result.append(os.path.relpath(os.path.join(dirpath, filename), directory))
+        for d in subdirs:
+            path = os.path.join(dirpath, d)
+            dirs[path] = os.path.getmtime(path)
+    return result, dirs
+
+
+def filter_files_extensions(files: list[str], extensions: list[str]) -> list[str]:
+    return sorted(f for f in files if os.path.splitext(f)[-1].lower() in extensions or len(extensions) == 0)
+
+
+def get_filename_list(folder_name: str) -> list[str]:
+    paths, extensions = folder_names_and_paths[folder_name]
+    files = []
+    for path in paths:
+        files += recursive_search(path)[0]
+    return filter_files_extensions(files, extensions)
@@ -0,0 +1,20 @@
+# stand-in for comfyui `server`, routes are registered on a route table and events are recorded instead of sent
+from aiohttp import web
+
+
+class PromptServer:
+    instance = None
+
+    def __init__(self):
+        self.routes = web.RouteTableDef()
+        self.on_prompt_handlers = []
+        self.messages = []
+
+    def send_sync(self, event, data, sid=None):
+        self.messages.append((event, data))
+
+    def add_on_prompt_handler(self, handler):
+        self.on_prompt_handlers.append(handler)
+
+
+PromptServer.instance = PromptServer()
@@ -0,0 +1,108 @@
+# synthetic preset trees, csv files and image folders, all seeded so every run writes the same data
+import csv
+import io
+import json
+import os
+import random
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+WORDS = [
+    "masterpiece", "best quality", "1girl", "solo", "long hair", "short hair", "smile", "looking at viewer", "outdoors",
+    "sky", "cloud", "tree", "city", "night", "rain", "sunset", "red dress", "blue eyes", "white background", "portrait",
+    "upper body", "full body", "from above", "from side", "depth of field", "bokeh", "film grain", "watercolor",
+    "oil painting", "sketch", "lineart", "cinematic lighting", "volumetric light", "ray tracing", "hdr", "4k",
+]  # fmt: skip
+
+
+def random_prompt(rng: random.Random, tags: int = 16, weighted=True) -> str:
+    # comma separated tags, some wrapped in (), [] or (tag:weight) when `weighted`
+    parts = []
+    for _ in range(tags):
+        tag = rng.choice(WORDS)
+        roll = rng.random() if weighted else 1.0
+        if roll < 0.1:
+            tag = f"({tag})"
+        elif roll < 0.15:
+            tag = f"[{tag}]"
+        elif roll < 0.25:
+            tag = f"({tag}:{rng.uniform(0.5, 1.5):.2f})"
+        parts.append(tag)
+    return ", ".join(parts)
+
+
+def write_preset_csv(path: Path, rows: int, seed: int = 0, tags: int = 16):
+    rng = random.Random(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "prompt"])
+        for i in range(rows):
+            writer.writerow([f"preset {i}", random_prompt(rng, tags)])
+
+
+def write_preset_tree(presets_dir: Path, entries: int, files: int = 10, seed: int = 0):
+    # `PresetManager` tree: half of the files csv, half yaml (dict of groups), `entries` presets in total
+    rng = random.Random(seed)
+    presets_dir.mkdir(parents=True, exist_ok=True)
+    per_file = max(entries // files, 1)
+    for i in range(files):
+        if i % 2 == 0:
+            write_preset_csv(presets_dir / f"group_{i}.csv", per_file, seed=seed + i)
+        else:
+            # yaml written by hand, json is valid yaml and much faster to produce
+            data = dict()
+            for j in range(per_file):
+                data.setdefault(f"set{j // 100}", dict())[f"preset {j}"] = random_prompt(rng)
+            with open(presets_dir / f"group_{i}.yml", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+
+
+def write_advanced_preset_tree(presets_dir: Path, entries: int, files: int = 10, seed: int = 0):
+    # `PresetManagerAdvanced` tree, json files of positive / negative prompt and lora entries
+    rng = random.Random(seed)
+    presets_dir.mkdir(parents=True, exist_ok=True)
+    per_file = max(entries // files, 1)
+    for i in range(files):
+        data = dict()
+        for j in range(per_file):
+            data[f"preset {j}"] = {
+                "positive_prompt": random_prompt(rng),
+                "negative_prompt": random_prompt(rng, tags=6, weighted=False),
+                "lora": {"lora_name": f"lora_{j % 7}.safetensors", "weight": round(rng.uniform(0.2, 1.0), 2)},
+            }
+        with open(presets_dir / f"group_{i}.json", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+
+def make_image(size: tuple[int, int], seed: int = 0, alpha=False) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    channels = 4 if alpha else 3
+    array = rng.integers(0, 256, (size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(array, "RGBA" if alpha else "RGB")
+
+
+def write_image_folder(directory: Path, count: int, size: tuple[int, int] = (64, 64), distinct: int = 16, subdirs: int = 0, seed: int = 0):
+    # `count` png files named with mixed numbers (`img_<n>_<m>.png`) in shuffled creation order.
+    # only `distinct` images are encoded, the files reuse their bytes so large folders are quick to write
+    rng = random.Random(seed)
+    blobs = []
+    for i in range(distinct):
+        buffer = io.BytesIO()
+        make_image(size, seed + i).save(buffer, format="PNG", compress_level=1)
+        blobs.append(buffer.getvalue())
+
+    directory.mkdir(parents=True, exist_ok=True)
+    targets = [directory] + [directory / f"sub_{i}" for i in range(subdirs)]
+    for target in targets[1:]:
+        target.mkdir(exist_ok=True)
+    indices = list(range(count))
+    rng.shuffle(indices)
+    for n, i in enumerate(indices):
+        path = targets[i % len(targets)] / f"img_{i // 10}_{i % 10}.png"
+        path.write_bytes(blobs[i % distinct])
+        # distinct mtimes so the "Time Modified" orders are well defined
+        os.utime(path, ns=(1_600_000_000_000_000_000 + n * 1_000_000, 1_600_000_000_000_000_000 + n * 1_000_000))
+    return directory
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+import server
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from synthetic import write_preset_tree
+
+from lib.custom_server import PresetWatcher, on_prompt
+from lib.node.preset import PromptHelper_RandomPreset
+from lib.preset import PresetManager
+
+
+@pytest.mark.parametrize("value, expected", [("", 0.0), (" 2.5 ", 2.5), ("0", 0.0), ("soon", 0.0), ("inf", 0.0), ("nan", 0.0)])
+def test_watch_interval(monkeypatch, value, expected):
+    monkeypatch.setenv("PROMPT_HELPER_WATCH_PRESETS", value)
+    assert PresetWatcher.read_interval() == expected
+
+
+def test_on_prompt_draws_random_presets(presets_dir):
+    write_preset_tree(presets_dir, 100, files=4)
+    PresetManager.get_group_index()
+    server.PromptServer.instance.messages.clear()
+    stale = "group_0: preset 1"
+    prompt = {
+        "3": {"class_type": "PromptHelper_RandomPreset", "inputs": {"groups": "group_0, group_1", "seed": 7, "choice_preset": stale}},
+        "4": {"class_type": "PromptHelper_RandomPreset", "inputs": {"groups": "group_0", "seed": ["5", 0], "choice_preset": stale}},
+        "5": {"class_type": "PromptHelper_RandomPreset", "inputs": {"groups": "missing", "seed": 1, "choice_preset": stale}},
+        "6": {"class_type": "KSampler", "inputs": {}},
+    }
+    on_prompt({"prompt": prompt})
+    drawn = prompt["3"]["inputs"]["choice_preset"]
+    assert drawn.count("\n") == 1 and drawn == "\n".join(PresetManager.random_presets("group_0, group_1", 7))
+    # a linked seed or an unmatched pattern clears the previous keys, so the node draws (or raises) by itself
+    assert prompt["4"]["inputs"]["choice_preset"] == prompt["5"]["inputs"]["choice_preset"] == ""
+    assert [(data["node_id"], data["value"]) for _, data in server.PromptServer.instance.messages] == [("3", drawn), ("4", ""), ("5", "")]
+
+    node = PromptHelper_RandomPreset()
+    assert node.load_preset("group_0", 3, prompt["4"]["inputs"]["choice_preset"])[0] == PresetManager.get_preset(PresetManager.random_presets("group_0", 3)[0])
+    with pytest.raises(ValueError):
+        node.load_preset("missing", 1, prompt["5"]["inputs"]["choice_preset"])
+
+
+def test_on_prompt_warms_presets_off_the_loop(presets_dir):
+    write_preset_tree(presets_dir, 100, files=4)
+    prompt = {"3": {"class_type": "PromptHelper_RandomPreset", "inputs": {"groups": "group_0", "seed": 7, "choice_preset": "group_0: preset 1"}}}
+    on_prompt({"prompt": prompt})
+    # not loaded yet, the handler leaves the draw to the node and loads the presets on a thread
+    assert prompt["3"]["inputs"]["choice_preset"] == ""
+    for _ in range(100):
+        if PresetManager.is_warm():
+            break
+        time.sleep(0.05)
+    assert PresetManager.is_warm()
+    on_prompt({"prompt": prompt})
+    assert prompt["3"]["inputs"]["choice_preset"] == PresetManager.random_presets("group_0", 7)[0]
+
+
+def request(method: str, path: str, **kwargs):
+    async def run():
+        app = web.Application()
+        app.add_routes(server.PromptServer.instance.routes)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.request(method, path, **kwargs)
+            body = await response.json() if response.content_type == "application/json" else await response.text()
+            return response.status, body
+
+    return asyncio.run(run())
+
+
+def test_search_route(presets_dir):
+    write_preset_tree(presets_dir, 100, files=4)
+    status, body = request("GET", "/prompt_helper/presets/search", params={"q": "group_2", "limit": "3"})
+    assert status == 200 and body["total"] == 25 and len(body["items"]) == 3
+    assert request("GET", "/prompt_helper/presets/search", params={"manager": "Nope"})[0] == 400
+    assert request("GET", "/prompt_helper/presets/search", params={"offset": "x"})[0] == 400
+
+
+def test_refresh_and_flush_routes(presets_dir):
+    assert request("POST", "/prompt_helper/refresh")[0] == 200
+    assert request("POST", "/prompt_helper/flush")[0] == 200
+    status, body = request("GET", "/prompt_helper/stats")
+    assert status == 200 and isinstance(body, dict)
@@ -0,0 +1,211 @@
+import json
+import os
+import random
+import threading
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from synthetic import make_image, write_image_folder
+
+from lib.node.file_io import (
+    SAVE_FORMATS,
+    DirectoryListing,
+    ImageWriteQueue,
+    PromptHelper_LoadImageBatchFromDir,
+    PromptHelper_LoadImageListFromDir,
+    PromptHelper_SaveImageToDir,
+    decode_image_to_tensor,
+    list_image_files,
+    map_ordered,
+    save_image,
+)
+
+
+@pytest.fixture
+def image_dir(custom_nodes_dir, tmp_path):
+    return write_image_folder(tmp_path / "images", 120)
+
+
+def test_sort_orders(image_dir):
+    by_number = [p.stem for p in list_image_files(str(image_dir), sort_by="As Number (Asc)")]
+    assert by_number[:2] == ["img_0_0", "img_0_1"] and by_number[10] == "img_1_0" and by_number[-1] == "img_11_9"
+    by_text = [p.stem for p in list_image_files(str(image_dir), sort_by="As Text (Asc)")]
+    assert by_text[10] == "img_10_0"
+    by_time = [p.stem for p in list_image_files(str(image_dir), sort_by="Time Modified (ASC)")]
+    indices = list(range(120))
+    random.Random(0).shuffle(indices)
+    assert by_time == [f"img_{i // 10}_{i % 10}" for i in indices]
+    assert list_image_files(str(image_dir), skips=118, sort_by="As Number (Desc)")[-1].stem == "img_0_0"
+
+
+def test_listing_invalidated_on_add(image_dir):
+    assert len(list_image_files(str(image_dir))) == 120
+    make_image((64, 64)).save(image_dir / "extra.png")
+    assert len(list_image_files(str(image_dir))) == 121
+    (image_dir / "sub").mkdir()
+    make_image((64, 64)).save(image_dir / "sub" / "nested.png")
+    assert len(list_image_files(str(image_dir), recursive=True)) == 122
+    with pytest.raises(FileNotFoundError):
+        list_image_files(str(image_dir / "missing"))
+
+
+def test_time_order_follows_in_place_edits(image_dir):
+    first = list_image_files(str(image_dir), sort_by="Time Modified (DESC)")[0]
+    last = list_image_files(str(image_dir), sort_by="Time Modified (DESC)")[-1]
+    directory_mtime = image_dir.stat().st_mtime_ns
+    # rewriting a file does not change its directory's mtime, the time order must still pick it up
+    last.write_bytes(last.read_bytes())
+    os.utime(last, ns=(2_000_000_000_000_000_000, 2_000_000_000_000_000_000))
+    assert image_dir.stat().st_mtime_ns == directory_mtime
+    assert list_image_files(str(image_dir), sort_by="Time Modified (DESC)")[:2] == [last, first]
+    assert list_image_files(str(image_dir), sort_by="Time Modified (ASC)")[-1] == last
+
+
+def test_load_image_batch(image_dir):
+    make_image((32, 48), alpha=True).save(image_dir / "img_99_0.png")
+    node = PromptHelper_LoadImageBatchFromDir()
+    images, masks, count, filenames = node.load_images(str(image_dir), skips=100, sort_by="As Number (Asc)", trim_suffix=True, dtype="float16", resize="pad", width=64, height=64)
+    assert images.shape == (21, 64, 64, 3) and masks.shape == (21, 64, 64) and images.dtype == torch.float16
+    assert count == 21 and filenames[-1] == "img_99_0"
+    # the transparent source and the letterbox padding both end up masked
+    assert masks[-1, :, :8].min() == 1.0
+    assert masks[:-1].max() == 0.0
+
+    with pytest.raises(ValueError):
+        node.load_images(str(image_dir), sort_by="As Number (Asc)")
+
+
+def test_load_image_list_chunks(image_dir):
+    node = PromptHelper_LoadImageListFromDir()
+    seen = []
+    for _ in range(4):
+        images, masks, indices, filenames, total = node.load_images(str(image_dir), sort_by="As Number (Asc)", chunk_size=50, chunk_index=-1)
+        seen.append(indices)
+    assert total == 120 and len(images) == len(masks) == len(filenames) == 50
+    assert [s[0] for s in seen] == [0, 50, 100, 0] and len(seen[2]) == 20
+    with pytest.raises(ValueError):
+        node.load_images(str(image_dir), chunk_size=50, chunk_index=3)
+
+
+def test_decode_cache_matches(image_dir):
+    image_path = list_image_files(str(image_dir))[0]
+    tensor, mask = decode_image_to_tensor(image_path)
+    for _ in range(2):
+        cached, cached_mask = decode_image_to_tensor(image_path, use_cache=True)
+        assert torch.equal(cached, tensor) and torch.equal(cached_mask, mask)
+
+
+@pytest.mark.parametrize("format", list(SAVE_FORMATS.keys()))
+def test_save_formats(tmp_path, format):
+    images = torch.rand((3, 32, 32, 3), dtype=torch.bfloat16)
+    node = PromptHelper_SaveImageToDir()
+    result = node.save_images(images, str(tmp_path), "out", filenames=["a", "b", "a"], prompt={"1": {"inputs": {}}}, format=format)
+    files = sorted(p.name for p in (tmp_path / "out").iterdir())
+    suffix = SAVE_FORMATS[format]
+    if format == "npy":
+        assert files == ["a.json", "a.npy", "b.json", "b.npy"] and result["ui"]["images"] == []
+        assert np.array_equal(np.load(tmp_path / "out" / "a.npy"), images[2].float().numpy())
+        assert json.loads((tmp_path / "out" / "a.json").read_text()) == {"prompt": {"1": {"inputs": {}}}}
+    else:
+        assert files == [f"a{suffix}", f"b{suffix}"]
+        assert [r["filename"] for r in result["ui"]["images"]] == [f"b{suffix}", f"a{suffix}"]
+    if format == "png":
+        with Image.open(tmp_path / "out" / "a.png") as image:
+            assert json.loads(image.text["prompt"]) == {"1": {"inputs": {}}}
+
+
+def test_save_widget_order():
+    # saved workflows restore widget values by position, new widgets only ever go at the end
+    optional = list(PromptHelper_SaveImageToDir.INPUT_TYPES()["optional"])
+    assert optional[:3] == ["sub_directory", "filenames", "compress_level"]
+    assert optional.index("format") > optional.index("background")
+
+
+def test_save_background_then_foreground(tmp_path):
+    # a foreground save waits for queued background writes of the same file, so its image is the one on disk
+    release = threading.Event()
+    ImageWriteQueue.submit(release.wait)
+    node = PromptHelper_SaveImageToDir()
+    assert node.save_images(torch.zeros((1, 8, 8, 3)), str(tmp_path), filenames="x", background=True) == {"ui": {"images": []}}
+    threading.Timer(0.1, release.set).start()
+    node.save_images(torch.ones((1, 8, 8, 3)), str(tmp_path), filenames="x")
+    ImageWriteQueue.flush()
+    with Image.open(tmp_path / "x.png") as image:
+        assert image.getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_save_background_workers(tmp_path):
+    # the shared pool takes the node's worker count, writes queued on a replaced pool still finish before flush returns
+    node = PromptHelper_SaveImageToDir()
+    release = threading.Event()
+    ImageWriteQueue.submit(release.wait, workers=1)
+    node.save_images(torch.rand((4, 8, 8, 3)), str(tmp_path), "a", background=True, workers=2)
+    assert ImageWriteQueue._executor_workers == 2 and ImageWriteQueue._executor._max_workers == 2
+    node.save_images(torch.rand((4, 8, 8, 3)), str(tmp_path), "b", background=True, workers=1)
+    assert ImageWriteQueue._executor_workers == 1
+    release.set()
+    ImageWriteQueue.flush()
+    assert sorted(p.name for p in (tmp_path / "a").iterdir()) == sorted(p.name for p in (tmp_path / "b").iterdir()) == [f"{i}.png" for i in range(4)]
+
+
+def test_map_ordered_keeps_order():
+    assert list(map_ordered(lambda x: x * 2, range(100), workers=8)) == [x * 2 for x in range(100)]
+
+
+# benchmarks
+
+
+@pytest.fixture(scope="module")
+def image_folders(tmp_path_factory):
+    root = tmp_path_factory.mktemp("folders")
+    return {count: write_image_folder(root / f"n{count}", count, size=(8, 8), subdirs=4) for count in [1000, 10000]}
+
+
+@pytest.fixture(scope="module")
+def large_image_folder(tmp_path_factory):
+    return write_image_folder(tmp_path_factory.mktemp("large") / "n100000", 100000, size=(8, 8), subdirs=16)
+
+
+@pytest.mark.parametrize("count", [1000, 10000])
+@pytest.mark.parametrize("sort_by", ["None", "As Number (Asc)", "Time Modified (DESC)"])
+def test_bench_list_image_files_cold(benchmark, image_folders, count, sort_by):
+    directory = str(image_folders[count])
+    benchmark.pedantic(list_image_files, (directory, 0, sort_by, True), setup=DirectoryListing._cache.clear, rounds=5)
+
+
+@pytest.mark.parametrize("count", [1000, 10000])
+def test_bench_list_image_files_cached(benchmark, image_folders, count):
+    directory = str(image_folders[count])
+    list_image_files(directory, 0, "As Number (Asc)", True)
+    benchmark(list_image_files, directory, 0, "As Number (Asc)", True)
+
+
+@pytest.mark.large
+@pytest.mark.parametrize("cached", [False, True], ids=["cold", "cached"])
+def test_bench_list_image_files_100k(benchmark, large_image_folder, cached):
+    directory = str(large_image_folder)
+    list_image_files(directory, 0, "As Number (Asc)", True)
+    setup = None if cached else DirectoryListing._cache.clear
+    benchmark.pedantic(list_image_files, (directory, 0, "As Number (Asc)", True), setup=setup, rounds=3)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_bench_load_image_batch(benchmark, custom_nodes_dir, tmp_path, workers):
+    directory = write_image_folder(tmp_path / "images", 64, size=(512, 512))
+    node = PromptHelper_LoadImageBatchFromDir()
+    benchmark(node.load_images, str(directory), workers=workers)
+
+
+@pytest.mark.parametrize("format", list(SAVE_FORMATS.keys()))
+def test_bench_save_image_1024(benchmark, tmp_path, format):
+    # ms per image in the benchmark, encoded size in `extra_info`. smooth gradients with mild noise, pure noise
+    # would not compress and make every format look the same
+    y, x = np.mgrid[0:1024, 0:1024] / 1024.0
+    image = np.stack([np.sin(x * 6.0) * 0.5 + 0.5, y, (x + y) / 2.0], axis=-1)
+    image += np.random.default_rng(0).normal(0.0, 0.02, image.shape)
+    image = torch.from_numpy(np.clip(image, 0.0, 1.0).astype(np.float32))
+    output_file = tmp_path / f"image{SAVE_FORMATS[format]}"
+    benchmark(save_image, image, output_file, format)
+    benchmark.extra_info["bytes"] = output_file.stat().st_size
@@ -0,0 +1,113 @@
+import pytest
+import torch
+
+from lib.node.format import (
+    ConditioningCache,
+    PromptHelper_ConcatConditioning,
+    PromptHelper_EncodeMultiStringCombine,
+    PromptHelper_TokenBudgetPrompt,
+    TokenCountCache,
+)
+
+
+def make_conditioning(count: int, length: int = 77, batch: int = 1, seed: int = 0, dtype=torch.float32):
+    generator = torch.Generator().manual_seed(seed)
+    return [[torch.randn((batch, length, 768), generator=generator).to(dtype), {"pooled_output": torch.randn((batch, 768), generator=generator)}] for _ in range(count)]
+
+
+def concat_reference(to, cond_from):
+    # comfyui `ConditioningConcat`, one torch.cat per entry, extended to pair `from` entries when there are as many
+    out = []
+    for i in range(len(to)):
+        source = cond_from[0][0] if len(cond_from) == 1 else cond_from[i][0]
+        out.append([torch.cat((to[i][0], source.expand(to[i][0].shape[0], -1, -1)), 1), to[i][1].copy()])
+    return out
+
+
+@pytest.mark.parametrize("from_count", [1, 4])
+def test_concat_conditioning_matches_reference(from_count):
+    to = make_conditioning(4) + make_conditioning(2, length=154, batch=2, seed=1)
+    to[1][0] = to[1][0].half()
+    cond_from = make_conditioning(from_count, seed=2)
+    if from_count > 1:
+        cond_from += make_conditioning(2, seed=3)
+    (out,) = PromptHelper_ConcatConditioning().concat(to=to, **{"from": cond_from})
+    expected = concat_reference(to, cond_from)
+    assert len(out) == len(expected)
+    for (cond, extras), (expected_cond, expected_extras) in zip(out, expected):
+        assert cond.shape == expected_cond.shape and cond.dtype == expected_cond.dtype
+        assert torch.equal(cond, expected_cond)
+        assert extras == expected_extras and extras is not expected_extras
+
+
+def test_concat_conditioning_rejects_mismatch():
+    with pytest.raises(RuntimeError):
+        PromptHelper_ConcatConditioning().concat(to=make_conditioning(3), **{"from": make_conditioning(2)})
+
+
+def test_encode_multi_string_reuses_parts(fake_clip):
+    ConditioningCache._entries.clear()
+    ConditioningCache._total_bytes = 0
+    node = PromptHelper_EncodeMultiStringCombine()
+    (first,) = node.combine(fake_clip, "a cat\n\n a dog \na cat")
+    assert len(first) == 3 and fake_clip.encode_count == 2
+    assert torch.equal(first[0][0], first[2][0])
+    (second,) = node.combine(fake_clip, "a dog\na cat")
+    assert fake_clip.encode_count == 2
+    assert torch.equal(second[1][0], first[0][0])
+    # entries are copies, editing one does not leak into the cache
+    second[0][1]["extra"] = 1
+    assert "extra" not in node.combine(fake_clip, "a dog")[0][0][1]
+
+
+def test_token_budget_skips_chunk_spill(fake_clip):
+    # a (72 tokens) fills most of the first chunk, b (a 6 token word) is padded over into the second one,
+    # c (70 tokens) fits the summed count of 150 but would need a third chunk
+    a = " ".join(["a"] * 72)
+    b = "b" * 24
+    c = " ".join(["c"] * 70)
+    prompt, report, tokens = PromptHelper_TokenBudgetPrompt().pack(fake_clip, f"{a}\n{b}\n{c}\nd", max_chunks=2)
+    assert prompt == f"{a}, {b}, d"
+    assert tokens == 72 + 1 + 6 + 1 + 1
+    assert TokenCountCache.measure(fake_clip, prompt)[1] == 2
+    assert [line.split("\t")[:2] for line in report.split("\n")] == [["72", "kept"], ["6", "kept"], ["70", "skipped"], ["1", "kept"]]
+
+
+def test_fake_clip_chunking(fake_clip):
+    # words shorter than 8 tokens move to the next chunk whole, longer ones are split across it
+    batches = fake_clip.tokenize(" ".join(["a"] * 72) + " " + "b" * 24, return_word_ids=True)["l"]
+    assert len(batches) == 2 and sum(1 for t in batches[0] if t[2] != 0) == 72
+    batches = fake_clip.tokenize(" ".join(["a"] * 72) + " " + "b" * 32, return_word_ids=True)["l"]
+    assert len(batches) == 2 and sum(1 for t in batches[0] if t[2] != 0) == 75
+
+
+# benchmarks
+
+
+@pytest.mark.parametrize("count", [1, 8, 64])
+@pytest.mark.parametrize("implementation", ["node", "reference"])
+def test_bench_concat_conditioning(benchmark, count, implementation):
+    to = make_conditioning(count)
+    cond_from = make_conditioning(1, seed=1)
+    if implementation == "node":
+        benchmark(PromptHelper_ConcatConditioning().concat, to=to, **{"from": cond_from})
+    else:
+        benchmark(concat_reference, to, cond_from)
+
+
+def test_bench_token_budget(benchmark, fake_clip):
+    text = "\n".join(f"tag{i} " * (i % 9 + 1) for i in range(200))
+    node = PromptHelper_TokenBudgetPrompt()
+
+    def pack():
+        TokenCountCache._entries.clear()
+        return node.pack(fake_clip, text, max_chunks=3)
+
+    benchmark(pack)
+
+
+def test_bench_encode_multi_string_cached(benchmark, fake_clip):
+    text = "\n".join(f"part {i}, detailed" for i in range(32))
+    node = PromptHelper_EncodeMultiStringCombine()
+    node.combine(fake_clip, text)
+    benchmark(node.combine, fake_clip, text)
@@ -0,0 +1,148 @@
+import random
+
+import pytest
+from synthetic import random_prompt
+
+from lib.node.format import PromptHelper_ConcatString, PromptHelper_FormatString
+from lib.node.helper import (
+    compile_template,
+    format_prompt_weights,
+    normalize_prompt,
+    parse_prompt_weights,
+    render_template,
+    split_prompt_tags,
+    trim_prompt_string,
+)
+from lib.node.weight import PromptHelper_WeightedPrompt
+
+
+def flatten(prompt, weight=1.0):
+    return format_prompt_weights(parse_prompt_weights(prompt, weight))
+
+
+def render(pattern, trim=False, **values):
+    return render_template(compile_template(pattern), values, trim)[0]
+
+
+# templates
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("[1], [2]", "a, b"),
+        ("[1|x] [3|fallback]", "a fallback"),
+        ("[1]{?, [2]}", "a, b"),
+        ("[1]{?, [3]}", "a"),
+        ("{[1]|[2]}", "{a|b}"),
+        ("{?x {[1]|[3]} y}", ""),
+        ("[blurry] [5] [str_1]", "[blurry] [5] [str_1]"),
+        ("{? [1] ", "{? a "),
+        ("}{", "}{"),
+    ],
+)
+def test_render_template(pattern, expected):
+    assert render(pattern, str_1="a", str_2="b", str_3="") == expected
+
+
+def test_render_template_does_not_rescan_values():
+    assert render("[1] [2]", str_1="[2]", str_2="b") == "[2] b"
+
+
+def test_format_string_trim():
+    assert PromptHelper_FormatString().format("[1], [2],", trim=True, str_1="  a  ", str_2="b ")[0] == "a, b"
+
+
+# tags
+
+
+def test_split_prompt_tags():
+    assert split_prompt_tags("a, (b, c), d\\,e") == ["a", "(b, c)", "d\\,e"]
+    assert split_prompt_tags("a | (b | c) | d", "|") == ["a", "(b | c)", "d"]
+    assert split_prompt_tags("a BREAK b", "BREAK") == ["a", "b"]
+
+
+def test_normalize_prompt_dedupe():
+    assert normalize_prompt("a,  b ,, a, (B:1.3), c", dedupe=True) == "a, (B:1.3), c"
+    assert normalize_prompt("a, (b, c), a") == "a, (b, c), a"
+
+
+@pytest.mark.parametrize(
+    "separator, values, expected",
+    [
+        (",", ["a, b", "b, c"], "a, b, c"),
+        ("|", ["a | (b:1.2)", "A|b|c"], "a| (b:1.2)| c"),
+        ("", ["a b", "a b", "c"], "a b c"),
+    ],
+)
+def test_concat_string_dedupe(separator, values, expected):
+    kwargs = {f"str_{i}": v for i, v in enumerate(values, 1)}
+    assert PromptHelper_ConcatString().join(separator, True, **kwargs)[0] == expected
+
+
+# weights
+
+
+@pytest.mark.parametrize(
+    "prompt, weight, expected",
+    [
+        ("a photo of (red) car", 1.0, "a photo of (red:1.100) car"),
+        ("a photo of (red) car", 0.5, "(a photo of:0.500) (red:0.550) (car:0.500)"),
+        ("(cat:1.25)", 0.5, "(cat:0.625)"),
+        ("((cat:1.25), dog, bird:0.5)", 1.0, "(cat:1.250), (dog:0.500), (bird:0.500)"),
+        ("((cat))", 0.5, "(cat:0.605)"),
+        ("[cat]", 1.0, "(cat:0.909)"),
+        ("(a) (b), c", 1.0, "(a b:1.100), c"),
+        ("(a, b:1.2) c", 1.0, "(a:1.200), (b:1.200) c"),
+        ("x\\(y\\) \\:3", 1.0, "x\\(y\\) \\:3"),
+        ("(a\\:1.5)", 1.0, "(a\\:1.5:1.100)"),
+        ("a) b", 1.0, "a\\) b"),
+        ("(unclosed [x", 1.0, "(unclosed:1.100) x"),
+        ("a,,b,", 1.0, "a, b"),
+    ],
+)
+def test_parse_prompt_weights(prompt, weight, expected):
+    assert flatten(prompt, weight) == expected
+
+
+def test_parse_prompt_weights_canonical_fuzz():
+    # the canonical form parses back to itself, on random soup of the characters the parser cares about
+    rng = random.Random(0)
+    alphabet = "ab c,()[]:.\\1"
+    for _ in range(20000):
+        prompt = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 24)))
+        canonical = flatten(prompt, rng.choice([1.0, 0.5, 1.3]))
+        assert flatten(canonical) == canonical, prompt
+
+
+def test_weighted_prompt_node():
+    node = PromptHelper_WeightedPrompt()
+    result = node.get_weighted_prompts(prompt_1="a (b)", weight_1=1.0, prompt_2="(c:1.2)", weight_2=0.5, prompt_3="", weight_3=1.0, prompt_4="d", weight_4=1.5, multiplier=1.0)
+    assert result == ("a (b:1.100), (c:0.600), (d:1.500)",)
+    assert "prompt_12" in node.INPUT_TYPES()["optional"]
+
+
+# benchmarks
+
+
+@pytest.fixture(scope="module")
+def long_prompt():
+    return random_prompt(random.Random(1), tags=10000)
+
+
+def test_bench_trim_prompt_string(benchmark, long_prompt):
+    benchmark(trim_prompt_string.__wrapped__, long_prompt)
+
+
+def test_bench_render_template(benchmark):
+    pattern = ", ".join(f"[{i}]{{?, ([{i + 1}]:1.2)}}" for i in range(1, 64, 2))
+    values = {f"str_{i}": f"tag {i}" for i in range(1, 64)}
+    benchmark(lambda: render_template(compile_template(pattern), values, True))
+
+
+def test_bench_parse_prompt_weights_10k_tags(benchmark, long_prompt):
+    benchmark(parse_prompt_weights, long_prompt, 0.8)
+
+
+def test_bench_normalize_prompt_10k_tags(benchmark, long_prompt):
+    benchmark(normalize_prompt.__wrapped__, long_prompt, True)
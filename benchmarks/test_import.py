@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+from importtime import CHILD_SCRIPT, PACKAGE_NAME, write_loras
+
+# records every folder_paths listing, runs before the import script
+RECORD_SCRIPT = """
+import sys
+sys.path.insert(0, {stubs!r})
+import folder_paths
+
+calls = []
+for name in ["get_filename_list", "recursive_search"]:
+    def record(*args, _func=getattr(folder_paths, name), _name=name, **kwargs):
+        calls.append([_name, *map(str, args)])
+        return _func(*args, **kwargs)
+    setattr(folder_paths, name, record)
+"""
+
+REPORT_SCRIPT = """
+import json
+preset = sys.modules[{name!r} + ".lib.preset"]
+print(json.dumps({{"calls": calls, "loaded": [m._presets is not None for m in (preset.PresetManager, preset.PresetManagerAdvanced)]}}))
+"""
+
+
+def test_import_does_not_scan(tmp_path):
+    # a ComfyUI start imports every custom node, listing loras or parsing presets there delays startup for everyone
+    benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+    write_loras(str(tmp_path / "loras"), 10)
+    (tmp_path / "custom_nodes" / "ComfyUI-Prompt-Helper" / "presets").mkdir(parents=True)
+    (tmp_path / "custom_nodes" / "ComfyUI-Prompt-Helper" / "presets" / "a.csv").write_text("name,prompt\nx,y\n")
+    kwargs = {
+        "stubs": os.path.join(benchmarks_dir, "stubs"),
+        "custom_nodes": str(tmp_path / "custom_nodes"),
+        "loras": str(tmp_path / "loras"),
+        "name": PACKAGE_NAME,
+        "package": os.path.dirname(benchmarks_dir),
+    }
+    script = RECORD_SCRIPT.format(**kwargs) + CHILD_SCRIPT.format(**kwargs) + REPORT_SCRIPT.format(**kwargs)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report == {"calls": [], "loaded": [False, False]}
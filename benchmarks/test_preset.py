@@ -0,0 +1,209 @@
+import csv
+import gc
+import io
+import os
+import random
+import time
+import tracemalloc
+
+import pytest
+import yaml
+from conftest import reset_preset_manager
+from synthetic import write_advanced_preset_tree, write_preset_csv, write_preset_tree
+
+import lib.preset
+from lib.preset import CsvIndex, PresetManager, PresetManagerAdvanced, PresetSearchIndex, iter_csv_records, read_csv_record
+
+CSV_TEXT = 'name,prompt\r\nplain,"a, b"\r\nmultiline,"first\nsecond, ""quoted"""\n\nunicode,"äöü, 猫"\nlast,tail'
+
+
+def test_iter_csv_records(tmp_path):
+    path = tmp_path / "records.csv"
+    path.write_bytes(CSV_TEXT.encode("utf-8"))
+    expected = list(csv.reader(io.StringIO(CSV_TEXT, newline="")))
+    with open(path, "rb") as f:
+        records = list(iter_csv_records(f))
+    assert [row for row, _, _ in records] == expected
+    # every record reads back on its own from its offset
+    for row, offset, length in records:
+        assert read_csv_record(path, offset, length) == row
+    assert sum(length for _, _, length in records) == path.stat().st_size
+
+
+def test_search_index():
+    keys = ["style: Watercolor", "style: oil painting", "artist: Monet", "artist: Manet", "light: golden hour"]
+    index = PresetSearchIndex(keys)
+    # prefix hits first, then substring hits, case insensitive
+    assert index.search("ARTIST") == (2, ["artist: Manet", "artist: Monet"])
+    assert index.search("paint") == (1, ["style: oil painting"])
+    assert index.search("t: m") == (2, ["artist: Monet", "artist: Manet"])
+    # no prefix or substring hit falls back to an in-order subsequence
+    assert index.search("gldhr") == (1, ["light: golden hour"])
+    assert index.search("zz") == (0, [])
+    assert index.search("", offset=1, limit=2) == (5, keys[1:3])
+    assert index.search("a", offset=1, limit=2) == (4, ["artist: Monet", "style: Watercolor"])
+
+
+def test_load_presets_delta(presets_dir):
+    write_preset_tree(presets_dir, 100, files=4)
+    delta = PresetManager.load_presets()
+    assert len(delta["added"]) == len(PresetManager.get_presets()) == 100
+    assert PresetManager.get_preset("group_1: set0.preset 3")
+
+    fingerprint = PresetManager.get_preset_fingerprint("group_0: preset 2")
+    (presets_dir / "group_0.csv").write_text("name,prompt\npreset 2,edited\npreset 99,new\n", encoding="utf-8")
+    (presets_dir / "group_3.yml").unlink()
+    delta = PresetManager.load_presets()
+    assert delta["changed"] == ["group_0: preset 2"]
+    assert delta["added"] == ["group_0: preset 99"]
+    assert len(delta["removed"]) == 24 + 25
+    assert PresetManager.get_preset_fingerprint("group_0: preset 2") != fingerprint
+    assert PresetManager.load_presets() == {"added": [], "removed": [], "changed": []}
+
+
+def test_load_presets_from_cache(presets_dir):
+    write_advanced_preset_tree(presets_dir, 50, files=5)
+    presets = dict(PresetManagerAdvanced.get_presets())
+    # a fresh process (manager state reset) picks the parsed files up from the pickled cache
+    reset_preset_manager(PresetManagerAdvanced)
+    assert PresetManagerAdvanced.get_presets() == presets
+    assert PresetManagerAdvanced.parse_preset(presets["group_0: preset 1"])[5][0][0] == "lora_1.safetensors"
+
+
+def test_csv_index_matches_in_memory(presets_dir, monkeypatch):
+    write_preset_csv(presets_dir / "large.csv", 200)
+    (presets_dir / "large.csv").write_bytes((presets_dir / "large.csv").read_bytes() + CSV_TEXT.split("\r\n", 1)[1].encode("utf-8"))
+    expected = dict(PresetManager.get_presets())
+
+    reset_preset_manager(PresetManager)
+    os.remove(PresetManager.get_cache_path())
+    monkeypatch.setattr(PresetManager, "csv_index_min_bytes", 0)
+    presets = PresetManager.get_presets()
+    assert presets.keys() == expected.keys()
+    # one shared index per file, not an object per row
+    assert len({id(v) for v in presets.values()}) == 1 and isinstance(next(iter(presets.values())), CsvIndex)
+    assert {k: PresetManager.get_preset(k) for k in presets} == expected
+    # and the same values from the pickled cache
+    reset_preset_manager(PresetManager)
+    assert {k: PresetManager.get_preset(k) for k in PresetManager.get_presets()} == expected
+
+    # an edited file is re-indexed before a stale offset is read
+    write_preset_csv(presets_dir / "large.csv", 10, seed=1)
+    key = "large: preset 3"
+    value = PresetManager.get_preset(key)
+    assert value != expected[key]
+    assert len(PresetManager.get_presets()) == 10
+
+
+def test_yaml_loaders_agree(presets_dir, monkeypatch):
+    (presets_dir / "styles.yml").write_text(
+        'flat: "a, (b:1.2)"\nlist:\n  - red, dress\n  - blue\ngroup:\n  multi: |\n    line one,\n    line two\n  uni: 猫, ä\n',
+        encoding="utf-8",
+    )
+    presets = dict(PresetManager.get_presets())
+    assert presets["styles: list.red"] == "red, dress" and presets["styles: group.uni"] == "猫, ä"
+    reset_preset_manager(PresetManager)
+    os.remove(PresetManager.get_cache_path())
+    monkeypatch.setattr(lib.preset, "YAML_LOADER", yaml.SafeLoader)
+    assert PresetManager.get_presets() == presets
+
+
+def test_random_presets(presets_dir):
+    write_preset_tree(presets_dir, 100, files=4)
+    picks = PresetManager.random_presets("group_0, group_[13]", 42)
+    assert picks == PresetManager.random_presets("group_0, group_[13]", 42)
+    assert picks[0].startswith("group_0: ") and picks[1].split(":")[0] in ["group_1", "group_3"]
+    with pytest.raises(ValueError):
+        PresetManager.random_presets("missing", 0)
+
+
+# benchmarks
+
+
+@pytest.mark.parametrize("entries", [1000, 10000, 100000])
+def test_bench_load_presets_cold(benchmark, presets_dir, entries):
+    write_preset_tree(presets_dir, entries)
+
+    def setup():
+        reset_preset_manager(PresetManager)
+        if os.path.exists(PresetManager.get_cache_path()):
+            os.remove(PresetManager.get_cache_path())
+
+    benchmark.pedantic(PresetManager.load_presets, setup=setup, rounds=3)
+
+
+@pytest.mark.parametrize("entries", [1000, 10000, 100000])
+def test_bench_load_presets_from_cache(benchmark, presets_dir, entries):
+    write_preset_tree(presets_dir, entries)
+    PresetManager.load_presets()
+    benchmark.pedantic(PresetManager.load_presets, setup=lambda: reset_preset_manager(PresetManager), rounds=5)
+
+
+def test_bench_reload_presets_unchanged(benchmark, presets_dir):
+    write_preset_tree(presets_dir, 100000)
+    PresetManager.load_presets()
+    benchmark(PresetManager.load_presets)
+
+
+@pytest.mark.parametrize("query", ["group_3: set", "preset 12", "gp3pst9"])
+def test_bench_search_presets(benchmark, presets_dir, query):
+    write_preset_tree(presets_dir, 100000)
+    PresetManager.search_presets("")
+    benchmark(PresetManager.search_presets, query)
+
+
+def test_bench_random_presets(benchmark, presets_dir):
+    write_preset_tree(presets_dir, 100000)
+    rng = random.Random(0)
+    PresetManager.random_presets("group_*", 0)
+    benchmark(lambda: PresetManager.random_presets("group_*, group_[02468]", rng.randrange(2**32)))
+
+
+def load_csv_measured(presets_dir, index: bool):
+    # (peak traced bytes, presets) of a cold load of the csv tree, indexed or held in memory
+    reset_preset_manager(PresetManager)
+    if os.path.exists(PresetManager.get_cache_path()):
+        os.remove(PresetManager.get_cache_path())
+    PresetManager.csv_index_min_bytes = 0 if index else float("inf")
+    gc.collect()
+    tracemalloc.start()
+    try:
+        presets = PresetManager.get_presets()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, presets
+
+
+@pytest.mark.parametrize("index", [False, True], ids=["in-memory", "indexed"])
+@pytest.mark.parametrize("rows", [100000, pytest.param(1000000, marks=pytest.mark.large)])
+def test_bench_csv_index(benchmark, presets_dir, monkeypatch, rows, index):
+    # load time in the benchmark, traced peak memory and the read time of one value in `extra_info`
+    monkeypatch.setattr(PresetManager, "csv_index_min_bytes", PresetManager.csv_index_min_bytes)
+    write_preset_csv(presets_dir / "large.csv", rows)
+    peak, presets = load_csv_measured(presets_dir, index)
+    benchmark.extra_info["file_bytes"] = (presets_dir / "large.csv").stat().st_size
+    benchmark.extra_info["peak_traced_bytes"] = peak
+
+    def setup():
+        reset_preset_manager(PresetManager)
+        os.remove(PresetManager.get_cache_path())
+
+    benchmark.pedantic(PresetManager.load_presets, setup=setup, rounds=1 if rows > 100000 else 3)
+    assert len(PresetManager.get_presets()) == len(presets) == rows
+    keys = [f"large: preset {i}" for i in random.Random(0).sample(range(rows), 1000)]
+    start = time.perf_counter()
+    for key in keys:
+        assert PresetManager.get_preset(key)
+    benchmark.extra_info["get_preset_us"] = (time.perf_counter() - start) / len(keys) * 1e6
+
+
+@pytest.mark.parametrize("index", [False, True], ids=["in-memory", "indexed"])
+def test_bench_csv_index_from_cache(benchmark, presets_dir, monkeypatch, index):
+    # warm start, unpickling the cache dominates. cache size in `extra_info`
+    monkeypatch.setattr(PresetManager, "csv_index_min_bytes", PresetManager.csv_index_min_bytes)
+    write_preset_csv(presets_dir / "large.csv", 100000)
+    load_csv_measured(presets_dir, index)
+    benchmark.extra_info["cache_bytes"] = os.path.getsize(PresetManager.get_cache_path())
+    benchmark.pedantic(PresetManager.load_presets, setup=lambda: reset_preset_manager(PresetManager), rounds=5)
+    assert PresetManager.get_preset("large: preset 3")
@@ -1,48 +1,173 @@
-import json
+import asyncio
+import math
+import os
+import threading
+import time
 
 from aiohttp import web
 import server
 
+from .node.file_io import ImageWriteQueue
 from .preset import PresetManager, PresetManagerAdvanced
+from .stats import Stats
 
 
 @server.PromptServer.instance.routes.post("/prompt_helper/refresh")
 async def refresh_preset_manager(request):
-    PresetManager.load_presets()
-    PresetManagerAdvanced.load_presets()
+    # parsing runs on the default executor so the event loop keeps serving while presets reload
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, PresetManager.load_presets)
+    await loop.run_in_executor(None, PresetManagerAdvanced.load_presets)
     return web.Response(status=200)
 
 
-# def on_prompt(json_data):
-#     prompt = json_data["prompt"]
-
-#     for k, v in prompt.items():
-#         if "class_type" in v and (
-#             v["class_type"]
-#             in ["PromptHelper_RandomPreset", "PromptHelper_RandomPresetAdvanced"]
-#         ):
-#             inputs = v["inputs"]
-#             input_seed = int(inputs["seed"])
-#             input_filename = inputs["filename"]
-#             if v["class_type"] == "PromptHelper_RandomPreset":
-#                 inputs["choice_preset"] = PresetManager.random_preset(
-#                     input_filename, input_seed
-#                 )
-#             elif v["class_type"] == "PromptHelper_RandomPresetAdvanced":
-#                 preset = PresetManagerAdvanced.random_preset(input_filename, input_seed)
-#                 inputs["choice_preset"] = json.dumps(preset)
-
-#             server.PromptServer.instance.send_sync(
-#                 "prompt-utilities-feedback",
-#                 {
-#                     "node_id": k,
-#                     "widget_name": "choice_preset",
-#                     "type": "STRING",
-#                     "value": inputs["choice_preset"],
-#                 },
-#             )
-
-#     return json_data
-
-
-# server.PromptServer.instance.add_on_prompt_handler(on_prompt)
+@server.PromptServer.instance.routes.get("/prompt_helper/presets/search")
+async def search_presets(request):
+    managers = {manager.__name__: manager for manager in [PresetManager, PresetManagerAdvanced]}
+    manager = managers.get(request.query.get("manager", "PresetManager"))
+    if manager is None:
+        return web.Response(status=400, text=f"Unknown preset manager: {request.query.get('manager')}")
+    try:
+        offset = max(int(request.query.get("offset", 0)), 0)
+        limit = min(max(int(request.query.get("limit", 50)), 0), 500)
+    except ValueError:
+        return web.Response(status=400, text="offset and limit must be integers")
+
+    # the first search after a reload builds the index, keep that off the event loop
+    loop = asyncio.get_running_loop()
+    total, items = await loop.run_in_executor(None, manager.search_presets, request.query.get("q", ""), offset, limit)
+    return web.json_response({"total": total, "offset": offset, "items": items})
+
+
+@server.PromptServer.instance.routes.post("/prompt_helper/flush")
+async def flush_image_writes(request):
+    # waits until every background save of Save Image (dir) is on disk
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, ImageWriteQueue.flush)
+    return web.Response(status=200)
+
+
+@server.PromptServer.instance.routes.get("/prompt_helper/stats")
+async def get_stats(request):
+    # profiling data, empty unless PROMPT_HELPER_PROFILE is set. `?format=prometheus` for the text exposition format
+    if request.query.get("reset"):
+        Stats.reset()
+    if request.query.get("format") == "prometheus":
+        return web.Response(text=Stats.to_prometheus(), content_type="text/plain", charset="utf-8")
+    return web.json_response(Stats.snapshot())
+
+
+class PresetWatcher:
+    # opt-in polling watcher, set PROMPT_HELPER_WATCH_PRESETS to the poll interval in seconds to enable it.
+    # each poll is a stat snapshot diff (see `PresetManagerBase.load_presets`) and only changed files are parsed
+    interval = 0.0
+    managers = [PresetManager, PresetManagerAdvanced]
+
+    _thread = None
+
+    @classmethod
+    def read_interval(cls) -> float:
+        value = os.environ.get("PROMPT_HELPER_WATCH_PRESETS", "").strip()
+        if not value:
+            return 0.0
+        try:
+            interval = float(value)
+        except ValueError:
+            interval = math.nan
+        if not math.isfinite(interval):
+            print(f"[Prompt Helper] Ignoring PROMPT_HELPER_WATCH_PRESETS='{value}', expected the poll interval in seconds")
+            return 0.0
+        return interval
+
+    @classmethod
+    def start(cls):
+        cls.interval = cls.read_interval()
+        if cls.interval <= 0 or cls._thread is not None:
+            return
+        cls._thread = threading.Thread(target=cls.run, name="prompt_helper_preset_watcher", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def run(cls):
+        while True:
+            time.sleep(cls.interval)
+            for manager in cls.managers:
+                if manager._presets is None:
+                    # not loaded by any node yet, the first `get_presets` will pick up the current files
+                    continue
+                try:
+                    delta = manager.load_presets()
+                except Exception as e:
+                    print(f"[Prompt Helper] Failed to reload presets of {manager.__name__}: {e}")
+                    continue
+                if delta["added"] or delta["removed"] or delta["changed"]:
+                    server.PromptServer.instance.send_sync("prompt-helper-presets", {"manager": manager.__name__, **delta})
+
+
+PresetWatcher.start()
+
+
+RANDOM_PRESET_NODES = {
+    "PromptHelper_RandomPreset": PresetManager,
+    "PromptHelper_RandomPresetAdvanced": PresetManagerAdvanced,
+}
+
+
+_warming = set()
+
+
+def warm_preset_manager(manager):
+    # loads the presets and builds the group index on a thread, the prompt handlers run on the event loop
+    if manager in _warming:
+        return
+    _warming.add(manager)
+
+    def run():
+        try:
+            manager.get_group_index()
+        except Exception as e:
+            print(f"[Prompt Helper] Failed to load presets of {manager.__name__}: {e}")
+        finally:
+            _warming.discard(manager)
+
+    threading.Thread(target=run, name="prompt_helper_preset_warmup", daemon=True).start()
+
+
+def on_prompt(json_data):
+    # draw random presets when the prompt is queued so the choice is saved with the prompt and shown on the node
+    prompt = json_data["prompt"]
+
+    for k, v in prompt.items():
+        manager = RANDOM_PRESET_NODES.get(v.get("class_type"))
+        if manager is None:
+            continue
+        inputs = v["inputs"]
+        keys = []
+        if not manager.is_warm():
+            # drawing now would parse the preset tree on the event loop, the node draws by itself this time
+            warm_preset_manager(manager)
+        else:
+            try:
+                keys = manager.random_presets(inputs["groups"], int(inputs["seed"]))
+            except Exception as e:
+                # e.g. a linked seed, or groups that match nothing, the node draws (or raises) by itself when executed
+                print(f"[Prompt Helper] Random preset draw skipped for node {k}: {e}")
+        if manager is PresetManagerAdvanced:
+            keys = keys[:1]
+        # always overwrite, the input holds the keys of the previous draw and an empty one makes the node draw
+        inputs["choice_preset"] = "\n".join(keys)
+
+        server.PromptServer.instance.send_sync(
+            "prompt-helper-feedback",
+            {
+                "node_id": k,
+                "widget_name": "choice_preset",
+                "type": "STRING",
+                "value": inputs["choice_preset"],
+            },
+        )
+
+    return json_data
+
+
+server.PromptServer.instance.add_on_prompt_handler(on_prompt)
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .stats import Stats
+
+
+class ImageCache:
+    # decoded images are stored as uint8 (H, W, 4) rgba `.npy` files named by a hash of path + mtime + size,
+    # so an edited or replaced file simply misses and its stale entry ages out through the LRU eviction
+    custom_nodes_dir = None
+    cache_dir = os.path.join(".cache", "images")
+    max_bytes = 8 * 1024**3
+
+    _lock = threading.Lock()
+    _entries = None
+    _total_bytes = 0
+
+    @classmethod
+    def get_custom_nodes_dir(cls):
+        # same lazy lookup as `PresetManagerBase.get_custom_nodes_dir`
+        if cls.custom_nodes_dir is None:
+            import folder_paths
+
+            cls.custom_nodes_dir = folder_paths.get_folder_paths("custom_nodes")[0]
+        return cls.custom_nodes_dir
+
+    @classmethod
+    def get_cache_dir(cls):
+        return os.path.join(cls.get_custom_nodes_dir(), "ComfyUI-Prompt-Helper", cls.cache_dir)
+
+    @classmethod
+    def get_entry_name(cls, image_path: Path):
+        stat = image_path.stat()
+        key = f"{image_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy"
+
+    @classmethod
+    def load_entries(cls):
+        # must be called with `_lock` held, entries are ordered from least to most recently used
+        if cls._entries is not None:
+            return
+        os.makedirs(cls.get_cache_dir(), exist_ok=True)
+        files = [entry for entry in os.scandir(cls.get_cache_dir()) if entry.name.endswith(".npy")]
+        files.sort(key=lambda x: x.stat().st_mtime_ns)
+        cls._entries = OrderedDict((entry.name, entry.stat().st_size) for entry in files)
+        cls._total_bytes = sum(cls._entries.values())
+
+    @classmethod
+    def get(cls, image_path: Path) -> np.ndarray | None:
+        name = cls.get_entry_name(image_path)
+        with cls._lock:
+            cls.load_entries()
+            if name not in cls._entries:
+                Stats.hit("image_cache", False)
+                return None
+            cls._entries.move_to_end(name)
+        Stats.hit("image_cache", True)
+
+        entry_path = os.path.join(cls.get_cache_dir(), name)
+        try:
+            # copy-on-write mapping, pages are only read when the array is copied into the output tensor
+            array = np.load(entry_path, mmap_mode="c")
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            cls.discard(name)
+            return None
+        return array
+
+    @classmethod
+    def put(cls, image_path: Path, rgb: np.ndarray, alpha: np.ndarray | None):
+        rgba = np.empty((*rgb.shape[:2], 4), dtype=np.uint8)
+        rgba[..., :3] = rgb
+        rgba[..., 3] = 255 if alpha is None else alpha
+
+        name = cls.get_entry_name(image_path)
+        entry_path = os.path.join(cls.get_cache_dir(), name)
+        temp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with cls._lock:
+            cls.load_entries()
+        with open(temp_path, "wb") as f:
+            np.save(f, rgba)
+        os.replace(temp_path, entry_path)
+
+        with cls._lock:
+            cls._total_bytes += rgba.nbytes - cls._entries.pop(name, 0)
+            cls._entries[name] = rgba.nbytes
+            cls.evict()
+
+    @classmethod
+    def discard(cls, name: str):
+        with cls._lock:
+            if cls._entries is not None and name in cls._entries:
+                cls._total_bytes -= cls._entries.pop(name)
+        try:
+            os.remove(os.path.join(cls.get_cache_dir(), name))
+        except OSError:
+            pass
+
+    @classmethod
+    def evict(cls):
+        # must be called with `_lock` held
+        while cls._total_bytes > cls.max_bytes and cls._entries:
+            name, size = cls._entries.popitem(last=False)
+            cls._total_bytes -= size
+            try:
+                os.remove(os.path.join(cls.get_cache_dir(), name))
+            except OSError:
+                pass
@@ -1,2 +1,63 @@
+import functools
+import re
+
+from ..stats import Stats
+
+
+def profile_function(function):
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        with Stats.timer(f"node.{type(self).__name__}"):
+            return function(self, *args, **kwargs)
+
+    return wrapper
+
+
+class lazy_class_property:
+    # class attribute computed on first access (e.g. a model list for `RETURN_TYPES`) instead of at import time
+    def __init__(self, func):
+        self.func = func
+        self.values = dict()
+
+    def __get__(self, instance, owner):
+        if owner not in self.values:
+            self.values[owner] = self.func(owner)
+        return self.values[owner]
+
+
+class DynamicInputs(dict):
+    # optional inputs that also accept any `<prefix><number>` name, e.g. `prompt_4` added by the frontend.
+    # comfyui only passes widget values of declared inputs to the node, this makes the numbered ones declared
+    def __init__(self, inputs: dict, templates: dict):
+        super().__init__(inputs)
+        self.templates = templates
+        self.pattern = re.compile("|".join(f"({re.escape(prefix)})\\d+" for prefix in templates))
+
+    def get_template(self, key):
+        match = self.pattern.fullmatch(key) if isinstance(key, str) else None
+        return self.templates[match.group(match.lastindex)] if match else None
+
+    def __contains__(self, key):
+        return super().__contains__(key) or self.get_template(key) is not None
+
+    def __getitem__(self, key):
+        if super().__contains__(key):
+            return super().__getitem__(key)
+        template = self.get_template(key)
+        if template is None:
+            raise KeyError(key)
+        return template
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
 class BaseNode:
     CATEGORY = "prompt_helper"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # with profiling enabled the node function is wrapped once, in the class that defines it
+        function = cls.__dict__.get(getattr(cls, "FUNCTION", None))
+        if Stats.enabled and function is not None:
+            setattr(cls, cls.FUNCTION, profile_function(function))
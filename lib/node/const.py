@@ -1,12 +1,14 @@
 from .base import BaseNode
-from .helper import trim_prompt_string
+from .helper import normalize_prompt, trim_prompt_string
 
 
 class PromptHelper_StringBase(BaseNode):
     RETURN_TYPES = ("STRING",)
     FUNCTION = "get_string"
 
-    def get_string(self, string: str):
+    def get_string(self, string: str, dedupe=False):
+        if dedupe:
+            return (normalize_prompt(string, dedupe=True),)
         return (trim_prompt_string(string),)
 
 
@@ -16,7 +18,10 @@ class PromptHelper_String(PromptHelper_StringBase):
         return {
             "required": {
                 "string": ("STRING", {"default": "", "multiline": False}),
-            }
+            },
+            "optional": {
+                "dedupe": ("BOOLEAN", {"default": False, "tooltip": "If enabled, duplicate tags are removed, keeping the strongest weight."}),
+            },
         }
 
 
@@ -26,5 +31,8 @@ class PromptHelper_StringMultiLine(PromptHelper_StringBase):
         return {
             "required": {
                 "string": ("STRING", {"default": "", "multiline": True}),
-            }
+            },
+            "optional": {
+                "dedupe": ("BOOLEAN", {"default": False, "tooltip": "If enabled, duplicate tags are removed, keeping the strongest weight."}),
+            },
         }
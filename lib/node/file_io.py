@@ -1,6 +1,10 @@
 import json
+import os
 import re
 import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
 import numpy as np
@@ -8,7 +12,10 @@ import torch
 from PIL import Image, ImageOps
 from PIL.PngImagePlugin import PngInfo
 
-from comfy.cli_args import args
+from ..image_cache import ImageCache
+from ..stats import Stats
+from .base import BaseNode
+from .helper import fingerprint
 
 VALID_IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp"]
 SORT_METHODS = [
@@ -20,57 +27,268 @@ SORT_METHODS = [
     "Time Modified (ASC)",
     "Time Modified (DESC)",
 ]
+SAVE_FORMATS = {
+    "png": ".png",
+    "webp (lossless)": ".webp",
+    "webp": ".webp",
+    "jpeg": ".jpg",
+    "npy": ".npy",
+}
+JPEG_MAX_EXIF_BYTES = 65533
+RESIZE_METHODS = ["none", "stretch", "crop", "pad"]
+IMAGE_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+}
+REGEX_NUMBER = re.compile(r"(\d+)")
+
+
+def natural_sort_key(s: str):
+    # first number in the name (as before), then every text and number part in order, so `a_2_10` sorts after `a_2_9`
+    parts = REGEX_NUMBER.split(s)
+    first_number = int(parts[1]) if len(parts) > 1 else sys.maxsize
+    return (first_number, [int(part) if i % 2 else part for i, part in enumerate(parts)])
 
 
 def sort_files(image_files: list[Path], method: str | None = None):
     if method is None or method == "None":
-        return image_files
-
-    def as_number(s):
-        if match := re.search(r"\d+", s):
-            return int(match.group())
-        return sys.maxsize
+        return list(image_files)
 
     if method == "As Text (Asc)":
         return sorted(image_files)
     elif method == "As Text (Desc)":
         return sorted(image_files, reverse=True)
     elif method == "As Number (Asc)":
-        return sorted(image_files, key=lambda x: as_number(x.stem))
+        return sorted(image_files, key=lambda x: natural_sort_key(x.stem))
     elif method == "As Number (Desc)":
-        return sorted(image_files, key=lambda x: as_number(x.stem), reverse=True)
+        return sorted(image_files, key=lambda x: natural_sort_key(x.stem), reverse=True)
     elif method == "Time Modified (ASC)":
-        return sorted(image_files, key=lambda x: x.stat().st_mtime)
+        return sorted(image_files, key=lambda x: os.stat(x).st_mtime_ns)
     elif method == "Time Modified (DESC)":
-        return sorted(image_files, key=lambda x: x.stat().st_mtime, reverse=True)
+        return sorted(image_files, key=lambda x: os.stat(x).st_mtime_ns, reverse=True)
     else:
         raise ValueError(f"Unknown sort method: {method}")
 
 
-def load_image_to_tensor(image_path: Path) -> tuple[Image.Image, torch.Tensor]:
-    # from comfyui `class LoadImage` at nodes.py, modified to general purpose function
+def scan_image_files(directory: str, recursive=False) -> tuple[list[Path], dict[str, int]]:
+    # one os.scandir pass without a stat per file, only the "Time Modified" orders stat the files when sorting.
+    # also returns the mtime of every scanned directory, which is what invalidates a cached listing
+    image_files = []
+    dir_mtimes = dict()
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        dir_mtimes[current] = os.stat(current).st_mtime_ns
+        # joining a name onto the parsed directory is cheaper than parsing every full path
+        current_path = Path(current)
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in VALID_IMAGE_EXTENSIONS:
+                    image_files.append(current_path / entry.name)
+    return image_files, dir_mtimes
+
+
+class DirectoryListing:
+    # scanned and sorted image files per (directory, recursive), reused while no scanned directory's mtime changed.
+    # editing a file in place does not touch its directory, so the "Time Modified" orders are never cached and
+    # stat the files on every call
+    max_entries = 32
+    uncached_sort_methods = ["Time Modified (ASC)", "Time Modified (DESC)"]
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def is_valid(cls, dir_mtimes: dict[str, int]):
+        try:
+            return all(os.stat(d).st_mtime_ns == mtime for d, mtime in dir_mtimes.items())
+        except OSError:
+            return False
+
+    @classmethod
+    def get(cls, directory: str, recursive=False, sort_by=None) -> list[Path]:
+        key = (os.path.abspath(directory), recursive)
+        with cls._lock:
+            listing = cls._cache.get(key)
+        if listing is None or not cls.is_valid(listing["dir_mtimes"]):
+            image_files, dir_mtimes = scan_image_files(key[0], recursive)
+            listing = {"dir_mtimes": dir_mtimes, "files": image_files, "sorted": dict()}
+
+        with cls._lock:
+            if sort_by not in listing["sorted"] and sort_by not in cls.uncached_sort_methods:
+                listing["sorted"][sort_by] = sort_files(listing["files"], sort_by)
+            cls._cache[key] = listing
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > cls.max_entries:
+                cls._cache.popitem(last=False)
+            if sort_by not in cls.uncached_sort_methods:
+                return listing["sorted"][sort_by]
+        return sort_files(listing["files"], sort_by)
+
+
+def list_image_files(directory: str, skips: int = 0, sort_by=None, recursive=False) -> list[Path]:
+    input_dir = Path(directory)
+    if not input_dir.exists():
+        raise FileNotFoundError(f"Input directory '{directory}' does not exist.")
+    if not input_dir.is_dir():
+        raise NotADirectoryError(f"Input path '{directory}' is not a directory.")
+
+    # slicing copies, callers never hold the cached list
+    image_files = DirectoryListing.get(directory, recursive, sort_by)[skips:]
+    if len(image_files) == 0:
+        raise FileNotFoundError(f"No image files found in directory '{directory}'.")
+    return image_files
+
+
+def fingerprint_image_files(image_files: list[Path]) -> str:
+    entries = []
+    for image_path in image_files:
+        stat = image_path.stat()
+        entries.append((str(image_path), stat.st_mtime_ns, stat.st_size))
+    return fingerprint(entries)
+
+
+def map_ordered(func, items, workers: int = 1):
+    # decode on a thread pool (PIL and numpy release the GIL), keeping at most
+    # `workers * 2` results in flight and yielding them in input order
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prompt_helper_decode")
+    try:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def probe_image_size(image_path: Path) -> tuple[int, int]:
+    # (width, height) as it will be after exif_transpose, read from the header only
+    with Image.open(image_path) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            return height, width
+        return width, height
+
+
+def image_to_arrays(image: Image.Image) -> tuple[np.ndarray, np.ndarray | None]:
+    # uint8 (H, W, 3) rgb array and uint8 (H, W) alpha array, alpha is None if the image has no transparency
+    if "A" in image.getbands() or (image.mode == "P" and "transparency" in image.info):
+        # a single rgba conversion, rgb and alpha are views of the same array
+        rgba = np.array(image.convert("RGBA"))
+        return rgba[..., :3], rgba[..., 3]
+    return np.array(image.convert("RGB")), None
+
+
+def decode_image(image_path: Path, use_cache=False) -> tuple[np.ndarray, np.ndarray | None]:
+    if use_cache and (rgba := ImageCache.get(image_path)) is not None:
+        return rgba[..., :3], rgba[..., 3]
+
     image = Image.open(image_path)
     image = ImageOps.exif_transpose(image)
-    image_rgb = image.convert("RGB")
-    image_array = np.array(image_rgb).astype(np.float32) / 255.0
-    tensor = torch.from_numpy(image_array)[None,]
-    return image, tensor
-
-
-def get_mask_from_image(image: Image.Image) -> torch.Tensor:
-    # from comfyui `class LoadImage` at nodes.py, modified to set default mask size to match image size
-    if "A" in image.getbands():
-        mask = np.array(image.getchannel("A")).astype(np.float32) / 255.0
-        mask = 1.0 - torch.from_numpy(mask)
-    elif image.mode == "P" and "transparency" in image.info:
-        mask = np.array(image.convert("RGBA").getchannel("A")).astype(np.float32) / 255.0
-        mask = 1.0 - torch.from_numpy(mask)
+    rgb, alpha = image_to_arrays(image)
+    if use_cache:
+        ImageCache.put(image_path, rgb, alpha)
+    return rgb, alpha
+
+
+def get_fit_size(src_size: tuple[int, int], dst_size: tuple[int, int], resize: str) -> tuple[int, int]:
+    # size the whole source image is scaled to before it is cropped or padded to `dst_size`
+    if resize == "stretch":
+        return dst_size
+    if resize == "crop":
+        scale = max(dst_size[0] / src_size[0], dst_size[1] / src_size[1])
+    elif resize == "pad":
+        scale = min(dst_size[0] / src_size[0], dst_size[1] / src_size[1])
     else:
-        mask = torch.zeros(image.size[::-1], dtype=torch.float32, device="cpu")
-    return mask
+        raise ValueError(f"Unknown resize method: {resize}")
+    return max(1, round(src_size[0] * scale)), max(1, round(src_size[1] * scale))
+
+
+def resize_image(image: Image.Image, size: tuple[int, int], resize: str) -> tuple[np.ndarray, np.ndarray | None]:
+    fit_size = get_fit_size(image.size, size, resize)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    if image.size != fit_size:
+        # reducing_gap lets pillow shrink by an integer factor with `reduce()` before the lanczos pass
+        image = image.resize(fit_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if resize == "crop":
+        left, top = (fit_size[0] - size[0]) // 2, (fit_size[1] - size[1]) // 2
+        image = image.crop((left, top, left + size[0], top + size[1]))
+    elif resize == "pad":
+        # letterbox, the padding is transparent so it ends up masked
+        canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+        canvas.paste(image.convert("RGBA"), ((size[0] - fit_size[0]) // 2, (size[1] - fit_size[1]) // 2))
+        image = canvas
+    return image_to_arrays(image)
+
+
+def decode_image_resized(image_path: Path, size: tuple[int, int], resize: str, use_cache=False) -> tuple[np.ndarray, np.ndarray | None]:
+    if use_cache:
+        # the cache holds full resolution decodes, resize from there
+        rgb, alpha = decode_image(image_path, use_cache)
+        if (rgb.shape[1], rgb.shape[0]) == size:
+            return rgb, alpha
+        image = Image.fromarray(np.ascontiguousarray(rgb)) if alpha is None else Image.fromarray(np.dstack((rgb, alpha)), "RGBA")
+        return resize_image(image, size, resize)
+
+    image = Image.open(image_path)
+    transposed = image.getexif().get(0x0112) in (5, 6, 7, 8)
+    src_size = image.size[::-1] if transposed else image.size
+    fit_size = get_fit_size(src_size, size, resize)
+    # JPEGs are decoded at the smallest DCT scale (1/2, 1/4, 1/8) that still covers the fit size, other formats ignore this
+    image.draft("RGB", fit_size[::-1] if transposed else fit_size)
+    image = ImageOps.exif_transpose(image)
+    return resize_image(image, size, resize)
 
 
-class PromptHelper_LoadImageBatchFromDir:
+def copy_image_into(rgb: np.ndarray, alpha: np.ndarray | None, image_out: torch.Tensor, mask_out: torch.Tensor):
+    # convert uint8 arrays into (H, W, 3) image and (H, W) mask tensors in place, in whatever dtype the outputs have
+    image_out.copy_(torch.from_numpy(rgb)).div_(255.0)
+    if alpha is None:
+        mask_out.zero_()
+    else:
+        mask_out.copy_(torch.from_numpy(alpha)).div_(-255.0).add_(1.0)
+
+
+def decode_image_into(image_path: Path, image_out: torch.Tensor, mask_out: torch.Tensor, use_cache=False, resize="none"):
+    # decode straight into slices of a preallocated batch, resizing to the slice size unless `resize` is "none"
+    with Stats.timer("decode_image", items=1) as sample:
+        if resize == "none":
+            rgb, alpha = decode_image(image_path, use_cache)
+        else:
+            rgb, alpha = decode_image_resized(image_path, (image_out.shape[1], image_out.shape[0]), resize, use_cache)
+        if rgb.shape[:2] != tuple(image_out.shape[:2]):
+            raise ValueError(f"All images must have the same dimensions. Expected {tuple(image_out.shape[:2])}, but got {rgb.shape[:2]} for file '{image_path.name}'.")
+        copy_image_into(rgb, alpha, image_out, mask_out)
+        if Stats.enabled:
+            sample["bytes"] = image_path.stat().st_size
+
+
+def decode_image_to_tensor(image_path: Path, use_cache=False, dtype=torch.float32) -> tuple[torch.Tensor, torch.Tensor]:
+    # (1, H, W, 3) image and (H, W) mask tensors
+    with Stats.timer("decode_image", items=1) as sample:
+        rgb, alpha = decode_image(image_path, use_cache)
+        tensor = torch.empty((1, *rgb.shape[:2], 3), dtype=dtype)
+        mask = torch.empty(rgb.shape[:2], dtype=dtype)
+        copy_image_into(rgb, alpha, tensor[0], mask)
+        if Stats.enabled:
+            sample["bytes"] = image_path.stat().st_size
+    return tensor, mask
+
+
+class PromptHelper_LoadImageBatchFromDir(BaseNode):
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -82,6 +300,12 @@ class PromptHelper_LoadImageBatchFromDir:
                 "sort_by": (SORT_METHODS,),
                 "trim_suffix": ("BOOLEAN", {"default": False, "tooltip": "If enabled, FILENAMES output will have the file suffix removed."}),
                 "recursive": ("BOOLEAN", {"default": False, "tooltip": "If enabled, the directory will be searched recursively."}),
+                "workers": ("INT", {"default": 4, "min": 1, "max": 64, "step": 1, "tooltip": "Number of threads used to decode images. 1 = decode serially."}),
+                "cache": ("BOOLEAN", {"default": False, "tooltip": "If enabled, decoded images are cached on disk and reused while the file is unchanged."}),
+                "dtype": (list(IMAGE_DTYPES.keys()), {"tooltip": "Precision of the IMAGE and MASK outputs. float16/bfloat16 halve the memory, but not every node accepts them."}),
+                "resize": (RESIZE_METHODS, {"tooltip": "How images that differ from the batch size are handled. none = raise an error, stretch = ignore aspect ratio, crop = fill and center crop, pad = fit and letterbox (padding is masked)."}),
+                "width": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8, "tooltip": "Batch width when resizing. 0 = width of the first image."}),
+                "height": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8, "tooltip": "Batch height when resizing. 0 = height of the first image."}),
             },
         }
 
@@ -89,50 +313,38 @@ class PromptHelper_LoadImageBatchFromDir:
     RETURN_NAMES = ("IMAGE", "MASK", "COUNT", "FILENAMES")
     FUNCTION = "load_images"
     CATEGORY = "image"
-    DESCRIPTION = "Loads all images from a directory as a single batch. All images must have the same dimensions."
-
-    def load_images(self, directory: str, skips: int = 0, sort_by=None, trim_suffix=False, recursive=False):
-        input_dir = Path(directory)
-        if not input_dir.exists():
-            raise FileNotFoundError(f"Input directory '{directory}' does not exist.")
-        if not input_dir.is_dir():
-            raise NotADirectoryError(f"Input path '{directory}' is not a directory.")
-
-        generator = input_dir.rglob("*") if recursive else input_dir.glob("*")
-        image_files = [file for file in generator if file.suffix.lower() in VALID_IMAGE_EXTENSIONS]
-        image_files = sort_files(image_files, sort_by)
-        if skips > 0:
-            image_files = image_files[skips:]
-        if len(image_files) == 0:
-            raise FileNotFoundError(f"No image files found in directory '{directory}'.")
+    DESCRIPTION = "Loads all images from a directory as a single batch. All images must have the same dimensions unless a resize method is set."
 
-        image_tensors = []
-        mask_tensors = []
-        image_count = 0
-        target_shape = None
-        for image_path in image_files:
-            image, tensor = load_image_to_tensor(image_path)
-            mask = get_mask_from_image(image)
+    @classmethod
+    def IS_CHANGED(s, directory: str, skips: int = 0, sort_by=None, recursive=False, **kwargs):
+        return fingerprint_image_files(list_image_files(directory, skips, sort_by, recursive))
 
-            # Ensure all images have the same dimensions
-            if target_shape is None:
-                target_shape = tensor.shape[1:3]  # (height, width)
-            if tensor.shape[1:3] != target_shape:
-                raise ValueError(f"All images must have the same dimensions. Expected {target_shape}, but got {tensor.shape[1:3]} for file '{image_path.name}'.")
+    def load_images(self, directory: str, skips: int = 0, sort_by=None, trim_suffix=False, recursive=False, workers=4, cache=False, dtype="float32", resize="none", width=0, height=0):
+        image_files = list_image_files(directory, skips, sort_by, recursive)
 
-            image_tensors.append(tensor)
-            mask_tensors.append(mask)
-            image_count += 1
+        # probe the first image and decode every file directly into its slice of one preallocated batch
+        first_width, first_height = probe_image_size(image_files[0])
+        if resize == "none":
+            width, height = first_width, first_height
+        else:
+            width, height = width or first_width, height or first_height
+        count = len(image_files)
+        final_images = torch.empty((count, height, width, 3), dtype=IMAGE_DTYPES[dtype])
+        final_masks = torch.empty((count, height, width), dtype=IMAGE_DTYPES[dtype])
+
+        def decode(item):
+            index, image_path = item
+            decode_image_into(image_path, final_images[index], final_masks[index], cache, resize)
+
+        for _ in map_ordered(decode, enumerate(image_files), workers):
+            pass
 
-        final_images = torch.cat(image_tensors, dim=0)
-        final_masks = torch.cat([m.unsqueeze(0) for m in mask_tensors], dim=0)
-        count = len(image_tensors)
         filenames = [p.stem if trim_suffix else p.name for p in image_files]
 
         return (final_images, final_masks, count, filenames)
 
 
-class PromptHelper_LoadImageListFromDir:
+class PromptHelper_LoadImageListFromDir(BaseNode):
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -144,49 +356,178 @@ class PromptHelper_LoadImageListFromDir:
                 "sort_by": (SORT_METHODS,),
                 "trim_suffix": ("BOOLEAN", {"default": False, "tooltip": "If enabled, FILENAMES output will have the file suffix removed."}),
                 "recursive": ("BOOLEAN", {"default": False, "tooltip": "If enabled, the directory will be searched recursively."}),
+                "workers": ("INT", {"default": 4, "min": 1, "max": 64, "step": 1, "tooltip": "Number of threads used to decode images. 1 = decode serially."}),
+                "cache": ("BOOLEAN", {"default": False, "tooltip": "If enabled, decoded images are cached on disk and reused while the file is unchanged."}),
+                "dtype": (list(IMAGE_DTYPES.keys()), {"tooltip": "Precision of the IMAGE and MASK outputs. float16/bfloat16 halve the memory, but not every node accepts them."}),
+                "chunk_size": ("INT", {"default": 0, "min": 0, "max": sys.maxsize, "step": 1, "tooltip": "If > 0, only this many images are loaded per run. 0 = load all images."}),
+                "chunk_index": ("INT", {"default": 0, "min": -1, "max": sys.maxsize, "step": 1, "tooltip": "Which chunk to load when chunk_size > 0. -1 = advance to the next chunk on every run, wrapping around at the end."}),
             },
         }
 
-    RETURN_TYPES = ("IMAGE", "MASK", "INT", "STRING")
-    RETURN_NAMES = ("IMAGE", "MASK", "INDEX", "FILENAMES")
-    OUTPUT_IS_LIST = (True, True, True, True)
+    RETURN_TYPES = ("IMAGE", "MASK", "INT", "STRING", "INT")
+    RETURN_NAMES = ("IMAGE", "MASK", "INDEX", "FILENAMES", "TOTAL")
+    OUTPUT_IS_LIST = (True, True, True, True, False)
     FUNCTION = "load_images"
     CATEGORY = "image"
     DESCRIPTION = "Loads all images from a directory as a list of individual images."
 
-    def load_images(self, directory: str, skips: int = 0, sort_by=None, trim_suffix=False, recursive=False):
-        input_dir = Path(directory)
-        if not input_dir.exists():
-            raise FileNotFoundError(f"Input directory '{directory}' does not exist.")
-        if not input_dir.is_dir():
-            raise NotADirectoryError(f"Input path '{directory}' is not a directory.")
-
-        generator = input_dir.rglob("*") if recursive else input_dir.glob("*")
-        image_files = [file for file in generator if file.suffix.lower() in VALID_IMAGE_EXTENSIONS]
-        image_files = sort_files(image_files, sort_by)
-        if skips > 0:
-            image_files = image_files[skips:]
-        if len(image_files) == 0:
-            raise FileNotFoundError(f"No image files found in directory '{directory}'.")
+    # (directory, skips, sort_by, recursive, chunk_size) -> next chunk index for chunk_index = -1
+    _cursors = dict()
+
+    @classmethod
+    def IS_CHANGED(s, directory: str, skips: int = 0, sort_by=None, recursive=False, chunk_size=0, chunk_index=0, **kwargs):
+        if chunk_size > 0 and chunk_index < 0:
+            return float("nan")
+        return fingerprint_image_files(list_image_files(directory, skips, sort_by, recursive))
+
+    def load_images(self, directory: str, skips: int = 0, sort_by=None, trim_suffix=False, recursive=False, workers=4, cache=False, dtype="float32", chunk_size=0, chunk_index=0):
+        image_files = list_image_files(directory, skips, sort_by, recursive)
+        total = len(image_files)
+
+        # only decode the current window so huge folders can be iterated over several runs with bounded memory
+        offset = 0
+        if chunk_size > 0:
+            chunk_count = (total + chunk_size - 1) // chunk_size
+            if chunk_index < 0:
+                cursor_key = (directory, skips, sort_by, recursive, chunk_size)
+                chunk_index = self._cursors.get(cursor_key, 0) % chunk_count
+                self._cursors[cursor_key] = chunk_index + 1
+            elif chunk_index >= chunk_count:
+                raise ValueError(f"chunk_index {chunk_index} is out of range, directory '{directory}' has {chunk_count} chunks of {chunk_size} images.")
+            offset = chunk_index * chunk_size
+            image_files = image_files[offset : offset + chunk_size]
 
         image_tensors = []
         mask_tensors = []
         image_count = 0
-        for image_path in image_files:
-            image, tensor = load_image_to_tensor(image_path)
-            mask = get_mask_from_image(image)
-
+        for tensor, mask in map_ordered(lambda x: decode_image_to_tensor(x, cache, IMAGE_DTYPES[dtype]), image_files, workers):
             image_tensors.append(tensor)
             mask_tensors.append(mask)
             image_count += 1
 
-        indices = list(range(len(image_files)))
+        indices = list(range(offset, offset + len(image_files)))
         filenames = [p.stem if trim_suffix else p.name for p in image_files]
 
-        return (image_tensors, mask_tensors, indices, filenames)
+        return (image_tensors, mask_tensors, indices, filenames, total)
+
+
+def build_metadata(format: str, prompt=None, extra_pnginfo=None) -> PngInfo | bytes | dict | None:
+    # PngInfo for png, exif bytes for webp/jpeg (same tags as comfyui `class SaveAnimatedWEBP`),
+    # otherwise a dict that is written as a sidecar json next to the image
+    from comfy.cli_args import args
+
+    if args.disable_metadata or (prompt is None and extra_pnginfo is None):
+        return None
+
+    if format == "png":
+        metadata = PngInfo()
+        if prompt is not None:
+            metadata.add_text("prompt", json.dumps(prompt))
+        if extra_pnginfo is not None:
+            for x in extra_pnginfo:
+                metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+        return metadata
+
+    if format in ["webp (lossless)", "webp", "jpeg"]:
+        exif = Image.Exif()
+        if prompt is not None:
+            exif[0x0110] = "prompt:{}".format(json.dumps(prompt))
+        if extra_pnginfo is not None:
+            tag = 0x010F
+            for x in extra_pnginfo:
+                exif[tag] = "{}:{}".format(x, json.dumps(extra_pnginfo[x]))
+                tag -= 1
+        exif_bytes = exif.tobytes()
+        # a jpeg APP1 segment cannot hold more than 64KB, large workflows fall back to the sidecar
+        if format != "jpeg" or len(exif_bytes) <= JPEG_MAX_EXIF_BYTES:
+            return exif_bytes
+
+    metadata = dict()
+    if prompt is not None:
+        metadata["prompt"] = prompt
+    if extra_pnginfo is not None:
+        metadata.update(extra_pnginfo)
+    return metadata
+
+
+def save_image(image: torch.Tensor, output_file: Path, format: str, metadata=None, compress_level: int = 4, quality: int = 90):
+    with Stats.timer("save_image", items=1) as sample:
+        image = image.cpu()
+        if image.dtype == torch.bfloat16:
+            # numpy has no bfloat16
+            image = image.float()
+        if format == "npy":
+            np.save(output_file, image.numpy())
+        else:
+            # from comfyui `class SaveImage` at nodes.py
+            i = 255.0 * image.numpy()
+            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+            kwargs = dict()
+            if isinstance(metadata, bytes):
+                kwargs["exif"] = metadata
+            if format == "png":
+                img.save(output_file, pnginfo=metadata if isinstance(metadata, PngInfo) else None, compress_level=compress_level)
+            elif format == "webp (lossless)":
+                img.save(output_file, lossless=True, method=min(compress_level, 6), **kwargs)
+            elif format == "webp":
+                img.save(output_file, quality=quality, method=min(compress_level, 6), **kwargs)
+            elif format == "jpeg":
+                img.save(output_file, quality=quality, **kwargs)
+            else:
+                raise ValueError(f"Unknown save format: {format}")
+
+        if isinstance(metadata, dict):
+            with open(output_file.parent / f"{output_file.stem}.json", "w", encoding="utf-8") as f:
+                json.dump(metadata, f)
+        if Stats.enabled:
+            sample["bytes"] = output_file.stat().st_size
+
+
+class ImageWriteQueue:
+    # shared pool for background saves, `submit` blocks once `max_pending` images are waiting
+    # so a fast producer cannot pile up unbounded decoded batches in memory
+    max_workers = min(8, os.cpu_count() or 1)
+    max_pending = 64
+
+    _executor = None
+    _executor_workers = 0
+    _slots = threading.Semaphore(max_pending)
+    _futures = set()
+    _lock = threading.Lock()
 
+    @classmethod
+    def submit(cls, func, *args, workers: int | None = None):
+        # the pool is sized by the `workers` of the latest call, a resized pool still finishes what was queued on
+        # the old one and `flush` waits on those writes too
+        workers = workers or cls.max_workers
+        cls._slots.acquire()
+        with cls._lock:
+            if cls._executor is None or cls._executor_workers != workers:
+                if cls._executor is not None:
+                    cls._executor.shutdown(wait=False)
+                cls._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prompt_helper_save")
+                cls._executor_workers = workers
+            future = cls._executor.submit(func, *args)
+            cls._futures.add(future)
+        future.add_done_callback(cls.on_done)
+        return future
 
-class PromptHelper_SaveImageToDir:
+    @classmethod
+    def on_done(cls, future):
+        with cls._lock:
+            cls._futures.discard(future)
+        cls._slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            print(f"[Prompt Helper] Failed to save image in background: {future.exception()}")
+
+    @classmethod
+    def flush(cls):
+        with cls._lock:
+            futures = list(cls._futures)
+        wait(futures)
+
+
+class PromptHelper_SaveImageToDir(BaseNode):
     def __init__(self):
         self.type = "output"
 
@@ -200,7 +541,12 @@ class PromptHelper_SaveImageToDir:
             "optional": {
                 "sub_directory": ("STRING", {"default": ""}),
                 "filenames": ("STRING", {"default": ""}),
-                "compress_level": ("INT", {"default": 4, "min": 0, "max": 9, "step": 1, "tooltip": "PNG compression level (0-9). 0 = no compression, 9 = maximum compression."}),
+                "compress_level": ("INT", {"default": 4, "min": 0, "max": 9, "step": 1, "tooltip": "Compression effort (0-9). PNG zlib level, 0 = no compression, 9 = maximum compression. For WebP this is the encoder method, capped at 6."}),
+                "workers": ("INT", {"default": 4, "min": 1, "max": 64, "step": 1, "tooltip": "Number of threads used to encode and write images. 1 = save serially. Background saves of all nodes share one pool of the most recently used size."}),
+                "background": ("BOOLEAN", {"default": False, "tooltip": "If enabled, the node returns immediately and images are written in the background. No previews are shown as the files may not exist yet."}),
+                # appended after the older widgets, saved workflows restore widget values by position
+                "format": (list(SAVE_FORMATS.keys()), {"tooltip": "Output format. npy dumps the raw float tensor, metadata of npy (and of jpeg if too large for exif) is saved to a sidecar json."}),
+                "quality": ("INT", {"default": 90, "min": 1, "max": 100, "step": 1, "tooltip": "Quality of lossy WebP and JPEG."}),
             },
             "hidden": {
                 "prompt": "PROMPT",
@@ -222,27 +568,24 @@ class PromptHelper_SaveImageToDir:
         filenames: str | list[str] = None,
         prompt=None,
         extra_pnginfo=None,
+        format="png",
         compress_level=4,
+        quality=90,
+        workers=4,
+        background=False,
     ):
-        results = list()
         print(f"Saving {len(images)} images to directory: {directory} {sub_directory}, filenames: {filenames}")
-        for index, image in enumerate(images):
-            # from comfyui `class SaveImage` at nodes.py
-            i = 255.0 * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            metadata = None
-            if not args.disable_metadata:
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-
-            output_dir = Path(directory)
-            if sub_directory:
-                output_dir = output_dir / sub_directory
 
+        # metadata is identical for every image, serialize it once per call
+        metadata = build_metadata(format, prompt, extra_pnginfo)
+
+        output_dir = Path(directory)
+        if sub_directory:
+            output_dir = output_dir / sub_directory
+
+        jobs = dict()
+        for index, image in enumerate(images):
+            filename = ""
             if isinstance(filenames, str):
                 filename = filenames.strip()
             elif isinstance(filenames, list):
@@ -250,10 +593,29 @@ class PromptHelper_SaveImageToDir:
             if not filename:
                 filename = str(index)
 
-            output_file = output_dir / f"{filename}.png"
-            output_file.parent.mkdir(parents=True, exist_ok=True)
+            output_file = output_dir / f"{filename}{SAVE_FORMATS[format]}"
+            # a later image with the same name overwrites an earlier one, so only the last one is written
+            jobs.pop(output_file, None)
+            jobs[output_file] = image
+
+        for parent in {output_file.parent for output_file in jobs}:
+            parent.mkdir(parents=True, exist_ok=True)
+
+        def save(job):
+            output_file, image = job
+            save_image(image, output_file, format, metadata, compress_level, quality)
 
-            img.save(output_file, pnginfo=metadata, compress_level=compress_level)
-            results.append({"filename": output_file.name, "subfolder": output_file.parent.as_posix(), "type": self.type})
+        if background:
+            for job in jobs.items():
+                ImageWriteQueue.submit(save, job, workers=workers)
+            return {"ui": {"images": []}}
 
+        # earlier background writes may target the same files, let them finish first so this call's images win
+        ImageWriteQueue.flush()
+        for _ in map_ordered(save, jobs.items(), workers):
+            pass
+
+        results = list()
+        if format != "npy":
+            results = [{"filename": output_file.name, "subfolder": output_file.parent.as_posix(), "type": self.type} for output_file in jobs]
         return {"ui": {"images": results}}
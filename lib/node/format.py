@@ -1,7 +1,45 @@
+import weakref
+from collections import OrderedDict
+
 import torch
 
+from ..stats import Stats
 from .base import BaseNode
-from .helper import trim_prompt_string
+from .helper import compile_template, dedupe_prompt_tags, render_template, split_prompt_tags, trim_prompt_string
+
+
+class ConditioningCache:
+    # (clip, text) -> conditioning, least recently used entries are evicted once `max_bytes` of tensors are held.
+    # clips are matched by identity through a weakref, so a new clip object (e.g. with a lora applied) never hits
+    max_bytes = 512 * 1024**2
+
+    _entries = OrderedDict()
+    _total_bytes = 0
+
+    @classmethod
+    def get(cls, clip, text: str):
+        key = (id(clip), text)
+        entry = cls._entries.get(key)
+        if entry is None or entry[0]() is not clip:
+            Stats.hit("conditioning_cache", False)
+            return None
+        cls._entries.move_to_end(key)
+        Stats.hit("conditioning_cache", True)
+        return entry[1]
+
+    @classmethod
+    def put(cls, clip, text: str, conditioning):
+        key = (id(clip), text)
+        nbytes = 0
+        for cond, extras in conditioning:
+            nbytes += cond.nbytes + sum(v.nbytes for v in extras.values() if isinstance(v, torch.Tensor))
+        if key in cls._entries:
+            cls._total_bytes -= cls._entries.pop(key)[2]
+        cls._entries[key] = (weakref.ref(clip), conditioning, nbytes)
+        cls._total_bytes += nbytes
+        while cls._total_bytes > cls.max_bytes and cls._entries:
+            _, (_, _, size) = cls._entries.popitem(last=False)
+            cls._total_bytes -= size
 
 
 class PromptHelper_FormatString(BaseNode):
@@ -9,9 +47,10 @@ class PromptHelper_FormatString(BaseNode):
     def INPUT_TYPES(s):
         return {
             "required": {
-                "pattern": ("STRING", {"default": "[1], [2]"}),
+                "pattern": ("STRING", {"default": "[1], [2]", "tooltip": "[1] is replaced by str_1, [1|text] falls back to text if str_1 is empty, {?...} is dropped if any slot inside is empty."}),
             },
             "optional": {
+                "trim": ("BOOLEAN", {"default": False, "tooltip": "If enabled, inputs and the result are trimmed like prompts."}),
                 "str_1": ("STRING", {"forceInput": True}),
             },
         }
@@ -19,10 +58,11 @@ class PromptHelper_FormatString(BaseNode):
     RETURN_TYPES = ("STRING",)
     FUNCTION = "format"
 
-    def format(self, pattern: str, **kwargs):
-        for i in range(1, len(kwargs) + 1):
-            pattern = pattern.replace(f"[{i}]", kwargs[f"str_{i}"])
-        return (pattern,)
+    def format(self, pattern: str, trim=False, **kwargs):
+        result, _ = render_template(compile_template(pattern), kwargs, trim)
+        if trim:
+            result = trim_prompt_string(result)
+        return (result,)
 
 
 class PromptHelper_ConcatString(BaseNode):
@@ -33,6 +73,7 @@ class PromptHelper_ConcatString(BaseNode):
                 "separator": ("STRING", {"default": ","}),
             },
             "optional": {
+                "dedupe": ("BOOLEAN", {"default": False, "tooltip": "If enabled, duplicate tags across all inputs are removed, keeping the strongest weight."}),
                 "str_1": ("STRING", {"forceInput": True}),
             },
         }
@@ -40,8 +81,14 @@ class PromptHelper_ConcatString(BaseNode):
     RETURN_TYPES = ("STRING",)
     FUNCTION = "join"
 
-    def join(self, separator: str, **kwargs):
-        result = f"{separator.strip()} ".join([trim_prompt_string(x) for x in kwargs.values() if x])
+    def join(self, separator: str, dedupe=False, **kwargs):
+        separator = separator.strip()
+        parts = [trim_prompt_string(x) for x in kwargs.values() if x]
+        if dedupe:
+            # tags are split on the chosen separator, without one every input counts as a single tag
+            tags = [tag for part in parts for tag in split_prompt_tags(part, separator)] if separator else parts
+            parts = dedupe_prompt_tags(tags)
+        result = f"{separator} ".join(parts)
         return (result,)
 
 
@@ -71,17 +118,91 @@ class PromptHelper_EncodeMultiStringCombine(BaseNode):
             parts.remove("")
         if len(parts) == 0:
             return (None,)
-        # encode parts
-        parts_tokens = [clip.tokenize(part) for part in parts]
-        parts_encoded = [clip.encode_from_tokens_scheduled(tokens) for tokens in parts_tokens]
-        # combine parts
-        base_conditioning = parts_encoded[0]
-        if len(parts_encoded) > 1:
-            for part in parts_encoded[1:]:
-                base_conditioning += part
+        # encode each distinct part once, reusing cached conditioning from previous runs
+        parts_encoded = dict()
+        for part in dict.fromkeys(parts):
+            encoded = ConditioningCache.get(clip, part)
+            if encoded is None:
+                with Stats.timer("clip_encode", items=1):
+                    encoded = clip.encode_from_tokens_scheduled(clip.tokenize(part))
+                ConditioningCache.put(clip, part, encoded)
+            parts_encoded[part] = encoded
+        # combine parts, copying the entries so downstream nodes cannot modify the cached ones
+        base_conditioning = [[cond, extras.copy()] for part in parts for cond, extras in parts_encoded[part]]
         return (base_conditioning,)
 
 
+class TokenCountCache:
+    # (tokenizer, text) -> (number of tokens, number of chunks), tokenizers are shared between clip clones so they are the identity used
+    max_entries = 16384
+
+    _entries = OrderedDict()
+
+    @classmethod
+    def measure(cls, clip, text: str) -> tuple[int, int]:
+        key = (id(clip.tokenizer), text)
+        entry = cls._entries.get(key)
+        if entry is not None and entry[0]() is clip.tokenizer:
+            cls._entries.move_to_end(key)
+            Stats.hit("token_count_cache", True)
+            return entry[1]
+        Stats.hit("token_count_cache", False)
+
+        # word id 0 marks start, end and padding tokens, every batch is one chunk
+        tokens = clip.tokenize(text, return_word_ids=True).values()
+        count = max(sum(1 for batch in batches for token in batch if token[2] != 0) for batches in tokens)
+        chunks = max(len(batches) for batches in tokens)
+        cls._entries[key] = (weakref.ref(clip.tokenizer), (count, chunks))
+        while len(cls._entries) > cls.max_entries:
+            cls._entries.popitem(last=False)
+        return count, chunks
+
+
+class PromptHelper_TokenBudgetPrompt(BaseNode):
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "text": ("STRING", {"default": "", "multiline": True, "tooltip": "One part per line, earlier lines have higher priority."}),
+                "clip": ("CLIP", {"tooltip": "The CLIP model whose tokenizer is used for counting."}),
+                "max_chunks": ("INT", {"default": 1, "min": 1, "max": 32, "step": 1, "tooltip": "Number of 75-token chunks the prompt may use."}),
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "INT")
+    RETURN_NAMES = ("STRING", "REPORT", "TOKENS")
+    FUNCTION = "pack"
+    DESCRIPTION = "Joins the parts that fit into the token budget, skipping lower priority parts that would spill into another chunk."
+
+    def pack(self, clip, text: str, max_chunks: int = 1):
+        if clip is None:
+            raise RuntimeError("ERROR: clip input is invalid: None\n\nIf the clip is from a checkpoint loader node your checkpoint does not contain a valid clip or text encoder model.")
+        parts = [trim_prompt_string(part) for part in text.split("\n")]
+        parts = [part for part in parts if part]
+
+        # greedy by priority. the summed part counts (plus the `,` joining them) are only a lower bound, as the
+        # tokenizer pads a chunk instead of splitting a short word across it, so each candidate is tokenized as a whole
+        budget = 75 * max_chunks
+        used = 0
+        counts = [TokenCountCache.measure(clip, part)[0] for part in parts]
+        included = [False] * len(parts)
+        for i, count in enumerate(counts):
+            cost = count + (1 if used > 0 else 0)
+            if used + cost > budget:
+                continue
+            included[i] = True
+            _, chunks = TokenCountCache.measure(clip, ", ".join(part for part, keep in zip(parts, included) if keep))
+            if chunks > max_chunks:
+                included[i] = False
+            else:
+                used += cost
+
+        prompt = ", ".join(part for part, keep in zip(parts, included) if keep)
+        tokens, _ = TokenCountCache.measure(clip, prompt)
+        report = "\n".join(f"{count}\t{'kept' if keep else 'skipped'}\t{part}" for part, count, keep in zip(parts, counts, included))
+        return (prompt, report, tokens)
+
+
 class PromptHelper_ConcatConditioning(BaseNode):
     @classmethod
     def INPUT_TYPES(s):
@@ -101,16 +222,20 @@ class PromptHelper_ConcatConditioning(BaseNode):
 
         if _from is None or len(_from) == 0:
             return (_to,)
-        if len(_from) > 1:
-            raise RuntimeError("Warning: ConditioningConcat conditioning_from contains more than 1 cond, only the first one will actually be applied to conditioning_to.")
-        cond_from = _from[0][0]
+        if len(_from) != 1 and len(_from) != len(_to):
+            raise RuntimeError(f"ConditioningConcat conditioning_from must contain 1 cond (applied to every cond) or as many conds as conditioning_to ({len(_to)}), got {len(_from)}.")
 
+        # one torch.cat per entry, a shared preallocated buffer measured slower (benchmarks/test_format.py)
+        # and kept every output alive as long as any one of them
         out = []
         for i in range(len(_to)):
             t1 = _to[i][0]
-            tw = torch.cat((t1, cond_from), 1)
-            n = [tw, _to[i][1].copy()]
-            out.append(n)
+            cond_from = _from[0][0] if len(_from) == 1 else _from[i][0]
+            if cond_from.shape[0] == 1 and t1.shape[0] > 1:
+                # a `from` batch of 1 applies to the whole `to` batch
+                cond_from = cond_from.expand(t1.shape[0], *cond_from.shape[1:])
+            # pooled output and other extras always come from `to`, matching comfyui `ConditioningConcat`
+            out.append([torch.cat((t1, cond_from), 1), _to[i][1].copy()])
 
         return (out,)
 
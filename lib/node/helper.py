@@ -1,10 +1,270 @@
+import functools
+import hashlib
+import json
 import re
 
 REGEX_MULTI_SPACE = re.compile(r"(\s|\n|\r|\t)+")
+REGEX_TEMPLATE_TOKEN = re.compile(r"\[(\d+)(?:\|([^\[\]{}]*))?\]|\{\?|[{}]")
+REGEX_WEIGHT = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)\s*")
+BRACKET_PAIRS = {"(": ")", "[": "]"}
 
 
+def fingerprint(*values) -> str:
+    # stable content hash for `IS_CHANGED`, values must be json serializable (anything else is hashed by its str)
+    data = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=4096)
 def trim_prompt_string(prompt: str) -> str:
     prompt = prompt.strip()
     prompt = REGEX_MULTI_SPACE.sub(" ", prompt)
     prompt = prompt.strip(",")
     return prompt
+
+
+def split_prompt_tags(prompt: str, separator: str = ",") -> list[str]:
+    # split on the separator outside of brackets in one pass, `\(` and `\)` are literal characters
+    tags = []
+    depth = 0
+    start = 0
+    escaped = False
+    i = 0
+    while i < len(prompt):
+        c = prompt[i]
+        if escaped:
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c in "([":
+            depth += 1
+        elif c in ")]":
+            depth = max(depth - 1, 0)
+        elif depth == 0 and separator and prompt.startswith(separator, i):
+            tags.append(prompt[start:i])
+            start = i + len(separator)
+            i = start
+            continue
+        i += 1
+    tags.append(prompt[start:])
+    tags = [REGEX_MULTI_SPACE.sub(" ", tag).strip() for tag in tags]
+    return [tag for tag in tags if tag]
+
+
+def is_wrapped(tag: str) -> bool:
+    # whether the first bracket of the tag is closed by its last character, e.g. `(a)` but not `(a) (b)`
+    if len(tag) < 2 or tag[0] not in BRACKET_PAIRS or tag[-1] != BRACKET_PAIRS[tag[0]]:
+        return False
+    depth = 0
+    escaped = False
+    for c in tag[:-1]:
+        if escaped:
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+            if depth == 0:
+                return False
+    return True
+
+
+def parse_tag_weight(tag: str) -> tuple[str, float]:
+    # unwrap `((tag))`, `[tag]` and `(tag:1.2)`, an explicit weight is final (see `PromptHelper_WeightedPrompt`)
+    weight = 1.0
+    while is_wrapped(tag):
+        inner = tag[1:-1]
+        if tag[0] == "(":
+            text, separator, explicit = inner.rpartition(":")
+            escaped = (len(text) - len(text.rstrip("\\"))) % 2 == 1
+            if separator and not escaped and REGEX_WEIGHT.fullmatch(explicit):
+                return text.strip(), float(explicit)
+            weight *= 1.1
+        else:
+            weight /= 1.1
+        tag = inner.strip()
+    return tag, weight
+
+
+def parse_prompt_weights(prompt: str, weight: float = 1.0) -> list[list[tuple[str, float]]]:
+    """
+    Flatten a prompt into tags of (text, final weight) segments in a single linear pass.
+
+    Every `(...)` level multiplies by 1.1 and every `[...]` level divides by 1.1, starting from `weight`.
+    An explicit weight `(tags:1.2)` replaces the brackets around and inside it and is multiplied by `weight`,
+    so `((cat:1.25), dog, bird:0.5)` gives cat 1.25, dog 0.5 and bird 0.5 at weight 1.0.
+    Text next to a group stays in the same tag, `a photo of (red) car` is one tag of three segments.
+    Unbalanced brackets are kept escaped in the text, unclosed groups are closed at the end.
+    """
+    root = [None, None, []]  # [bracket, explicit weight, items], items are text, nested groups or None for a comma
+    stack = [root]
+    buffer = []
+
+    def flush():
+        text = REGEX_MULTI_SPACE.sub(" ", "".join(buffer)).strip()
+        buffer.clear()
+        if text:
+            stack[-1][2].append(text)
+
+    i = 0
+    while i < len(prompt):
+        c = prompt[i]
+        if c == "\\":
+            # keep escaped characters as written, a backslash before whitespace or at the end escapes nothing
+            if i + 1 < len(prompt) and not prompt[i + 1].isspace():
+                buffer.append(prompt[i : i + 2])
+                i += 2
+            else:
+                i += 1
+            continue
+        if c == ",":
+            flush()
+            stack[-1][2].append(None)
+        elif c in BRACKET_PAIRS:
+            flush()
+            group = [c, None, []]
+            stack[-1][2].append(group)
+            stack.append(group)
+        elif c in ")]" and len(stack) > 1 and BRACKET_PAIRS[stack[-1][0]] == c:
+            flush()
+            group = stack.pop()
+            items = group[2]
+            if c == ")" and items and isinstance(items[-1], str):
+                text, separator, explicit = items[-1].rpartition(":")
+                escaped = (len(text) - len(text.rstrip("\\"))) % 2 == 1
+                if separator and not escaped and REGEX_WEIGHT.fullmatch(explicit):
+                    group[1] = float(explicit)
+                    text = text.strip()
+                    if text:
+                        items[-1] = text
+                    else:
+                        items.pop()
+        elif c in ")]":
+            buffer.append("\\" + c)
+        else:
+            buffer.append(c)
+        i += 1
+    flush()
+
+    tags = [[]]
+    pending = [(item, weight, False) for item in reversed(root[2])]
+    while pending:
+        item, item_weight, fixed = pending.pop()
+        if item is None:
+            tags.append([])
+        elif isinstance(item, str):
+            segments = tags[-1]
+            # neighbouring segments of the same weight are merged, e.g. `(a) (b)` into `(a b:1.100)`
+            if segments and round(segments[-1][1], 3) == round(item_weight, 3):
+                segments[-1] = (f"{segments[-1][0]} {item}", segments[-1][1])
+            else:
+                segments.append((item, item_weight))
+        else:
+            bracket, explicit, items = item
+            if explicit is not None:
+                item_weight, fixed = explicit * weight, True
+            elif not fixed:
+                item_weight = item_weight * 1.1 if bracket == "(" else item_weight / 1.1
+            pending.extend((child, item_weight, fixed) for child in reversed(items))
+    return [segments for segments in tags if segments]
+
+
+def format_prompt_weights(tags: list[list[tuple[str, float]]]) -> str:
+    # canonical form of `parse_prompt_weights` output, parsing it again gives the same tags
+    parts = []
+    for segments in tags:
+        parts.append(" ".join(text if round(weight, 3) == 1.0 else f"({text}:{weight:.3f})" for text, weight in segments))
+    return ", ".join(parts)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_prompt(prompt: str, dedupe=False) -> str:
+    """
+    Re-emit a prompt as its tags joined by `, `, with whitespace and empty tags removed.
+
+    With `dedupe`, tags are compared by their lowercase text without brackets or weights,
+    and only the strongest occurrence is kept, at the position of the first one.
+    """
+    tags = split_prompt_tags(prompt)
+    if dedupe:
+        tags = dedupe_prompt_tags(tags)
+    return ", ".join(tags)
+
+
+def dedupe_prompt_tags(tags: list[str]) -> list[str]:
+    # see `normalize_prompt`, the strongest occurrence of each tag is kept at the position of the first one
+    kept = dict()
+    for tag in tags:
+        text, weight = parse_tag_weight(tag)
+        key = text.lower()
+        if key not in kept or weight > kept[key][1]:
+            position = kept[key][0] if key in kept else len(kept)
+            kept[key] = (position, weight, tag)
+    return [tag for _, _, tag in sorted(kept.values())]
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(pattern: str) -> tuple:
+    """
+    Parse a format pattern once into a token tree, cached per pattern.
+
+    `[1]` is replaced by str_1, `[1|text]` falls back to text when str_1 is empty,
+    `{?...}` is a section that is dropped as a whole if any slot inside it is empty.
+    Plain braces, e.g. dynamic prompt `{[1]|[2]}` alternations, and unbalanced braces are kept as text.
+    """
+    # each frame is (opening token, tokens), the root frame has no opening token
+    stack = [(None, [])]
+    position = 0
+    for match in REGEX_TEMPLATE_TOKEN.finditer(pattern):
+        if match.start() > position:
+            stack[-1][1].append(("text", pattern[position : match.start()]))
+        position = match.end()
+        token = match.group(0)
+        if token in ("{?", "{"):
+            stack.append((token, []))
+        elif token == "}":
+            if len(stack) == 1:
+                stack[-1][1].append(("text", token))
+                continue
+            opening, tokens = stack.pop()
+            if opening == "{?":
+                stack[-1][1].append(("section", tuple(tokens)))
+            else:
+                stack[-1][1].extend([("text", "{"), *tokens, ("text", "}")])
+        else:
+            stack[-1][1].append(("slot", f"str_{match.group(1)}", match.group(2), token))
+    if position < len(pattern):
+        stack[-1][1].append(("text", pattern[position:]))
+    while len(stack) > 1:
+        opening, tokens = stack.pop()
+        stack[-1][1].extend([("text", opening), *tokens])
+    return tuple(stack[0][1])
+
+
+def render_template(tokens: tuple, values: dict, trim=False) -> tuple[str, bool]:
+    # single pass over the compiled tokens, substituted values are never scanned again.
+    # returns the text and whether every slot had a value, which decides if an enclosing section is kept
+    parts = []
+    complete = True
+    for token in tokens:
+        if token[0] == "text":
+            parts.append(token[1])
+        elif token[0] == "slot":
+            _, key, default, raw = token
+            value = values.get(key)
+            if trim and value:
+                value = trim_prompt_string(value)
+            if not value and default is not None:
+                value = default
+            if not value:
+                complete = False
+                # slots without a connected input stay as written
+                value = raw if key not in values else ""
+            parts.append(value)
+        else:
+            text, section_complete = render_template(token[1], values, trim)
+            if section_complete:
+                parts.append(text)
+    return "".join(parts), complete
@@ -1,12 +1,12 @@
-import json
+from ..preset import PresetManager, PresetManagerAdvanced
+from .base import BaseNode, lazy_class_property
+from .helper import normalize_prompt, trim_prompt_string
 
-import numpy as np
 
-from .base import BaseNode
-from ..preset import PresetManager, PresetManagerAdvanced
-from .helper import trim_prompt_string
+def get_return_types_advanced(cls):
+    import folder_paths
 
-import folder_paths
+    return ("STRING", "STRING", folder_paths.get_filename_list("loras"), "FLOAT", "FLOAT", "LORA_STACK")
 
 
 class PromptHelper_LoadPreset(BaseNode):
@@ -15,17 +15,27 @@ class PromptHelper_LoadPreset(BaseNode):
         return {
             "required": {
                 "string": ("STRING", {"default": "", "multiline": True}),
-                "preset": (list(PresetManager.get_presets().keys()),),
-            }
+                "preset": ("STRING", {"default": "", "tooltip": "Preset key, use the search button to look it up."}),
+            },
+            "optional": {
+                "dedupe": ("BOOLEAN", {"default": False, "tooltip": "If enabled, tags repeated between the string and the preset are removed, keeping the strongest weight."}),
+            },
         }
 
     RETURN_TYPES = ("STRING",)
     FUNCTION = "load_preset"
 
-    def load_preset(self, string, preset):
-        prompt_1 = trim_prompt_string(string)
-        prompt_2 = trim_prompt_string(PresetManager.get_preset(preset))
-        prompt = trim_prompt_string(f"{prompt_1}, {prompt_2}")
+    @classmethod
+    def IS_CHANGED(s, preset, **kwargs):
+        # the preset text can change on reload while the key stays the same
+        return PresetManager.get_preset_fingerprint(preset)
+
+    def load_preset(self, string, preset, dedupe=False):
+        # both parts are already trimmed, joining the non-empty ones needs no second pass
+        parts = [trim_prompt_string(string), trim_prompt_string(PresetManager.get_preset(preset))]
+        prompt = ", ".join(part for part in parts if part)
+        if dedupe:
+            prompt = normalize_prompt(prompt, dedupe=True)
         return (prompt,)
 
 
@@ -34,16 +44,78 @@ class PromptHelper_LoadPresetAdvanced(BaseNode):
     def INPUT_TYPES(s):
         return {
             "required": {
-                "preset": (list(PresetManagerAdvanced.get_presets().keys()),),
+                "preset": ("STRING", {"default": "", "tooltip": "Preset key, use the search button to look it up."}),
             }
         }
 
-    RETURN_TYPES = ("STRING", "STRING", folder_paths.get_filename_list("loras"), "FLOAT", "FLOAT", "LORA_STACK")
+    # the lora list is read when comfyui first asks for the node info, not when the package is imported
+    RETURN_TYPES = lazy_class_property(get_return_types_advanced)
     RETURN_NAMES = ("positive prompt", "negative prompt", "lora name", "strength model", "strength clip", "lora stack")
     FUNCTION = "load_preset"
 
+    @classmethod
+    def IS_CHANGED(s, preset, **kwargs):
+        return PresetManagerAdvanced.get_preset_fingerprint(preset)
+
     def load_preset(self, preset):
         preset_ = PresetManagerAdvanced.get_preset(preset)
         positive_prompt, negative_prompt, lora_name, strength_model, sterngth_clip, lora_stack = PresetManagerAdvanced.parse_preset(preset_)
 
         return (positive_prompt, negative_prompt, lora_name, strength_model, sterngth_clip, lora_stack)
+
+
+class PromptHelper_RandomPreset(BaseNode):
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "groups": ("STRING", {"default": "*", "tooltip": "Comma separated preset groups (file names) to draw from, one preset per entry. Wildcards like `style_*` are allowed."}),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xFFFFFFFFFFFFFFFF, "control_after_generate": True}),
+                "choice_preset": ("STRING", {"default": "", "multiline": True, "tooltip": "Filled in with the drawn preset keys when the prompt is queued."}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    FUNCTION = "load_preset"
+
+    @classmethod
+    def IS_CHANGED(s, groups, seed, choice_preset, **kwargs):
+        keys = [key.strip() for key in choice_preset.split("\n") if key.strip()] or PresetManager.random_presets(groups, seed)
+        return [PresetManager.get_preset_fingerprint(key) for key in keys]
+
+    def load_preset(self, groups, seed, choice_preset):
+        # the draw normally happens in the `on_prompt` handler of custom_server.py, which also fills `choice_preset`
+        keys = [key.strip() for key in choice_preset.split("\n") if key.strip()]
+        if len(keys) == 0:
+            keys = PresetManager.random_presets(groups, seed)
+        parts = [trim_prompt_string(PresetManager.get_preset(key)) for key in keys]
+        prompt = ", ".join(part for part in parts if part)
+        return (prompt,)
+
+
+class PromptHelper_RandomPresetAdvanced(BaseNode):
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "groups": ("STRING", {"default": "*", "tooltip": "Preset groups (file names) to draw from. Wildcards like `style_*` are allowed."}),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xFFFFFFFFFFFFFFFF, "control_after_generate": True}),
+                "choice_preset": ("STRING", {"default": "", "tooltip": "Filled in with the drawn preset key when the prompt is queued."}),
+            }
+        }
+
+    RETURN_TYPES = lazy_class_property(get_return_types_advanced)
+    RETURN_NAMES = PromptHelper_LoadPresetAdvanced.RETURN_NAMES
+    FUNCTION = "load_preset"
+
+    @classmethod
+    def IS_CHANGED(s, groups, seed, choice_preset, **kwargs):
+        key = choice_preset.strip() or PresetManagerAdvanced.random_presets(groups, seed)[0]
+        return PresetManagerAdvanced.get_preset_fingerprint(key)
+
+    def load_preset(self, groups, seed, choice_preset):
+        key = choice_preset.strip()
+        if not key:
+            key = PresetManagerAdvanced.random_presets(groups, seed)[0]
+        preset_ = PresetManagerAdvanced.get_preset(key)
+        return PresetManagerAdvanced.parse_preset(preset_)
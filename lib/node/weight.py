@@ -1,22 +1,26 @@
-import re
-
-from .base import BaseNode
-from .helper import trim_prompt_string
+from .base import BaseNode, DynamicInputs
+from .helper import format_prompt_weights, parse_prompt_weights, trim_prompt_string
 
 
 class PromptHelper_WeightedPrompt(BaseNode):
     @classmethod
     def INPUT_TYPES(s):
+        prompt = ("STRING", {"default": "", "multiline": True})
+        weight = ("FLOAT", {"default": 1.0, "min": 0, "max": 2, "step": 0.1})
+        # more prompt_N / weight_N pairs are added by the frontend, see scripts/app.js
         return {
-            "optional": {
-                "prompt_1": ("STRING", {"default": "", "multiline": True}),
-                "weight_1": ("FLOAT", {"default": 1.0, "min": 0, "max": 2, "step": 0.1}),
-                "prompt_2": ("STRING", {"default": "", "multiline": True}),
-                "weight_2": ("FLOAT", {"default": 1.0, "min": 0, "max": 2, "step": 0.1}),
-                "prompt_3": ("STRING", {"default": "", "multiline": True}),
-                "weight_3": ("FLOAT", {"default": 1.0, "min": 0, "max": 2, "step": 0.1}),
-                "multiplier": ("FLOAT", {"default": 1.0, "min": 0, "max": 2, "step": 0.1}),
-            },
+            "optional": DynamicInputs(
+                {
+                    "prompt_1": prompt,
+                    "weight_1": weight,
+                    "prompt_2": prompt,
+                    "weight_2": weight,
+                    "prompt_3": prompt,
+                    "weight_3": weight,
+                    "multiplier": ("FLOAT", {"default": 1.0, "min": 0, "max": 2, "step": 0.1}),
+                },
+                {"prompt_": prompt, "weight_": weight},
+            ),
         }
 
     RETURN_TYPES = ("STRING",)
@@ -26,24 +30,26 @@ class PromptHelper_WeightedPrompt(BaseNode):
 
     """
     NOTE:
-    1.  Explicit weight, like (cat:1.25) is final weight, i.e., ignores all brackets.
-        e.g., `((cat:1.25), dog, bird:0.5)` equals to `cat:1.25, dog:0.5, bird:0.5`
+    1.  Explicit weight, like (cat:1.25) ignores all brackets, but still is multiplied by the input weight.
+        e.g., `((cat:1.25), dog, bird:0.5)` equals to `cat:1.25, dog:0.5, bird:0.5`, at weight 0.5 `cat:0.625` etc.
+    2.  Other tags get their bracket weight times the input weight times the multiplier,
+        e.g., `((cat))` at weight 0.5 equals to `cat:0.605`
+    3.  Text next to a bracket stays in the same tag, e.g., `a photo of (red) car` gives `a photo of (red:1.100) car`
+    4.  Any number of `prompt_N` / `weight_N` pairs is accepted, N counting up from 1. Use the buttons on the node to add more.
     """
 
     def get_weighted_prompts(self, **kwargs):
         multiplier = float(kwargs.get("multiplier", 1.0))
 
-        prompts = []
-        for i in [1, 2, 3]:
+        tags = []
+        i = 1
+        while f"prompt_{i}" in kwargs:
             prompt = trim_prompt_string(kwargs[f"prompt_{i}"])
-            weight = kwargs[f"weight_{i}"]
+            weight = float(kwargs.get(f"weight_{i}", 1.0))
+            i += 1
             if prompt == "" or weight == 0.0:
                 continue
-            final_weight = weight * multiplier
-            if final_weight == 1.0:
-                prompts.append(prompt)
-            else:
-                prompts.append(f"({prompt}:{final_weight:.3f})")
+            tags += parse_prompt_weights(prompt, weight * multiplier)
 
-        prompts_str = ", ".join(prompts)
+        prompts_str = format_prompt_weights(tags)
         return (prompts_str,)
@@ -1,23 +1,183 @@
+import bisect
 import csv
+import fnmatch
+import io
 import json
 import os
+import pickle
+import threading
+import time
+from array import array
 from pathlib import Path
 
-import folder_paths
 import numpy as np
 import yaml
 
+from .node.helper import fingerprint
+from .stats import Stats
+
+# libyaml parses preset trees several times faster, fall back to the pure python loader if pyyaml was built without it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class CsvIndex:
+    # where the values of a large preset file are, see `PresetManager.load_csv_index`. one object per file with
+    # the keys in file order and the byte offset and length of each record as columns, so it pickles as a few
+    # flat buffers. the key -> row lookup is built on first read and not pickled
+    def __init__(self, filename: str, column: int):
+        self.filename = filename
+        self.column = column
+        self.keys = []
+        self.offsets = array("Q")
+        self.lengths = array("Q")
+        self.rows = None
+
+    def append(self, key: str, offset: int, length: int):
+        self.keys.append(key)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def locate(self, key: str) -> tuple[int, int]:
+        if self.rows is None:
+            # a later row wins on duplicate names, same as `load_file`
+            self.rows = dict(zip(self.keys, range(len(self.keys))))
+        row = self.rows[key]
+        return self.offsets[row], self.lengths[row]
+
+    def __getstate__(self):
+        return {**self.__dict__, "rows": None}
+
+
+def iter_csv_records(f):
+    # csv rows of a binary file with the byte offset and length of each record. the csv reader pulls
+    # lines one record at a time, so the position after a row is the end of that record (quoted newlines included)
+    position = 0
+
+    def lines():
+        nonlocal position
+        for line in f:
+            position += len(line)
+            yield line.decode("utf-8")
+
+    start = 0
+    for row in csv.reader(lines()):
+        yield row, start, position - start
+        start = position
+
+
+def read_csv_record(path, offset: int, length: int) -> list[str]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    return next(csv.reader(io.StringIO(data.decode("utf-8"), newline="")), [])
+
+
+class PresetSearchIndex:
+    # sorted lowercase keys for prefix lookups with bisect, and trigram -> key index postings for substring lookups.
+    # queries without prefix or substring hits fall back to a fuzzy (in-order subsequence) scan
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.lower_keys = [k.lower() for k in self.keys]
+        self.sorted_keys = sorted(range(len(self.keys)), key=lambda i: self.lower_keys[i])
+        self.sorted_lower_keys = [self.lower_keys[i] for i in self.sorted_keys]
+        self.trigrams = dict()
+        for i, k in enumerate(self.lower_keys):
+            for trigram in {k[j : j + 3] for j in range(len(k) - 2)}:
+                if trigram not in self.trigrams:
+                    self.trigrams[trigram] = array("I")
+                self.trigrams[trigram].append(i)
+
+    def match_prefix(self, query):
+        lo = bisect.bisect_left(self.sorted_lower_keys, query)
+        hi = bisect.bisect_left(self.sorted_lower_keys, query + "\U0010ffff")
+        return self.sorted_keys[lo:hi]
+
+    def match_substring(self, query):
+        if len(query) < 3:
+            candidates = range(len(self.keys))
+        else:
+            postings = [self.trigrams.get(query[j : j + 3]) for j in range(len(query) - 2)]
+            if any(p is None for p in postings):
+                return []
+            candidates = min(postings, key=len)
+        return [i for i in candidates if query in self.lower_keys[i]]
+
+    def match_fuzzy(self, query):
+        matches = []
+        for i, k in enumerate(self.lower_keys):
+            it = iter(k)
+            if all(c in it for c in query):
+                matches.append(i)
+        return matches
+
+    def search(self, query: str, offset: int = 0, limit: int = 50):
+        query = query.strip().lower()
+        if not query:
+            return len(self.keys), self.keys[offset : offset + limit]
+
+        matches = self.match_prefix(query)
+        seen = set(matches)
+        matches += [i for i in self.match_substring(query) if i not in seen]
+        if len(matches) == 0:
+            matches = self.match_fuzzy(query)
+        return len(matches), [self.keys[i] for i in matches[offset : offset + limit]]
+
 
 class PresetManagerBase:
     _presets = None
+    # preset_filename -> ((st_mtime_ns, st_size), presets parsed from that file)
+    _files = None
+    _lock = threading.Lock()
+    # bumped whenever `_presets` is replaced, derived data such as the search index is rebuilt lazily
+    _generation = 0
+    _search_index = None
+    _group_index = None
+    _fingerprints = None
     file_extensions = []
 
-    custom_nodes_dir = folder_paths.get_folder_paths("custom_nodes")[0]
+    custom_nodes_dir = None
     presets_dir = "presets"
+    cache_dir = ".cache"
+    # bump when the parsed preset format changes to invalidate existing caches
+    cache_version = 2
+
+    @classmethod
+    def get_custom_nodes_dir(cls):
+        # resolved on first use so this module can be imported (and benchmarked) without a comfyui install
+        if cls.custom_nodes_dir is None:
+            import folder_paths
+
+            cls.custom_nodes_dir = folder_paths.get_folder_paths("custom_nodes")[0]
+        return cls.custom_nodes_dir
 
     @classmethod
     def get_presets_dir(cls):
-        return os.path.join(cls.custom_nodes_dir, "ComfyUI-Prompt-Helper", cls.presets_dir)
+        return os.path.join(cls.get_custom_nodes_dir(), "ComfyUI-Prompt-Helper", cls.presets_dir)
+
+    @classmethod
+    def get_cache_path(cls):
+        return os.path.join(cls.get_custom_nodes_dir(), "ComfyUI-Prompt-Helper", cls.cache_dir, f"{cls.__name__}.pickle")
+
+    @classmethod
+    def read_cache(cls):
+        try:
+            with open(cls.get_cache_path(), "rb") as f:
+                version, files = pickle.load(f)
+        except FileNotFoundError:
+            return dict()
+        except Exception as e:
+            print(f"[Prompt Helper] Ignoring unreadable preset cache '{cls.get_cache_path()}': {e}")
+            return dict()
+        return files if version == cls.cache_version else dict()
+
+    @classmethod
+    def write_cache(cls, files):
+        cache_path = cls.get_cache_path()
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump((cls.cache_version, files), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
 
     @classmethod
     def get_presets(cls):
@@ -28,59 +188,221 @@ class PresetManagerBase:
     @classmethod
     def get_preset(cls, key):
         presets = cls.get_presets()
-        return presets[key]
+        if key not in presets:
+            raise ValueError(f"Preset '{key}' not found in '{cls.get_presets_dir()}'.")
+        value = presets[key]
+        if isinstance(value, CsvIndex):
+            return cls.read_indexed_preset(key, value)
+        return value
+
+    @classmethod
+    def read_indexed_preset(cls, key, index: CsvIndex):
+        # values of indexed files are read on demand, a file edited since the last load is reloaded first
+        preset_path = os.path.join(cls.get_presets_dir(), index.filename)
+        try:
+            stat = os.stat(preset_path)
+            current = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            current = None
+        entry = cls._files.get(index.filename)
+        if entry is None or entry[0] != current:
+            cls.load_presets()
+            return cls.get_preset(key)
+        row = read_csv_record(preset_path, *index.locate(key))
+        return row[index.column] if index.column < len(row) else None
+
+    @classmethod
+    def get_preset_fingerprint(cls, key) -> str:
+        # content hash of one preset entry, memoized until the next reload changes `_generation`
+        presets = cls.get_presets()
+        if cls._fingerprints is None or cls._fingerprints[0] != cls._generation:
+            cls._fingerprints = (cls._generation, dict())
+        fingerprints = cls._fingerprints[1]
+        if key not in fingerprints:
+            fingerprints[key] = fingerprint(key, cls.get_preset(key) if key in presets else None)
+        return fingerprints[key]
+
+    @classmethod
+    def search_presets(cls, query: str, offset: int = 0, limit: int = 50):
+        presets = cls.get_presets()
+        index = cls._search_index
+        if index is None or index[0] != cls._generation:
+            index = (cls._generation, PresetSearchIndex(presets.keys()))
+            cls._search_index = index
+        return index[1].search(query, offset, limit)
+
+    @classmethod
+    def get_group_index(cls):
+        # (generation, group -> keys, pattern -> keys of every matching group), a group is the file stem before `: `
+        presets = cls.get_presets()
+        index = cls._group_index
+        if index is None or index[0] != cls._generation:
+            groups = dict()
+            for key in presets:
+                groups.setdefault(key.split(": ", 1)[0], []).append(key)
+            index = (cls._generation, {k: np.array(v, dtype=object) for k, v in groups.items()}, dict())
+            cls._group_index = index
+        return index
+
+    @classmethod
+    def is_warm(cls):
+        # presets loaded and grouped for the current generation, so `random_presets` neither parses nor indexes
+        index = cls._group_index
+        return cls._presets is not None and index is not None and index[0] == cls._generation
+
+    @classmethod
+    def get_pattern_keys(cls, pattern: str) -> np.ndarray:
+        _, groups, patterns = cls.get_group_index()
+        if pattern not in patterns:
+            matched = [groups[group] for group in fnmatch.filter(groups.keys(), pattern)]
+            patterns[pattern] = np.concatenate(matched) if matched else np.empty(0, dtype=object)
+        return patterns[pattern]
+
+    @classmethod
+    def random_presets(cls, patterns: str, seed: int) -> list[str]:
+        # one seeded draw per comma separated group pattern (wildcards allowed), each draw is a single array lookup
+        rng = np.random.default_rng(seed)
+        keys = []
+        for pattern in [x.strip() for x in patterns.split(",") if x.strip()]:
+            pattern_keys = cls.get_pattern_keys(pattern)
+            if len(pattern_keys) == 0:
+                raise ValueError(f"No preset group matches '{pattern}'.")
+            keys.append(str(pattern_keys[rng.integers(len(pattern_keys))]))
+        return keys
 
     @classmethod
     def get_preset_filename_list(cls):
+        import folder_paths
+
         files, _ = folder_paths.recursive_search(cls.get_presets_dir(), excluded_dir_names=[".git"])
         return folder_paths.filter_files_extensions(files, cls.file_extensions)
 
     @classmethod
     def load_presets(cls):
-        cls._presets = dict()
-        preset_filename_list = cls.get_preset_filename_list()
-        for preset_filename in preset_filename_list:
-            with open(os.path.join(cls.get_presets_dir(), preset_filename), "r", encoding="utf-8") as f:
-                cls.load_file(f, preset_filename)
+        # only files whose mtime or size changed are parsed again, deleted files drop out with the old index.
+        # on first load the index comes from the pickled cache so startup skips parsing unchanged files
+        # returns the keys added, removed or changed compared to the previous load
+        with cls._lock:
+            start_time = time.perf_counter()
+            first_load = cls._files is None
+            files = cls.read_cache() if first_load else cls._files
+            new_files = dict()
+            parsed_count = 0
+            for preset_filename in cls.get_preset_filename_list():
+                preset_path = os.path.join(cls.get_presets_dir(), preset_filename)
+                stat = os.stat(preset_path)
+                fingerprint = (stat.st_mtime_ns, stat.st_size)
+                if preset_filename in files and files[preset_filename][0] == fingerprint:
+                    new_files[preset_filename] = files[preset_filename]
+                    continue
+                new_files[preset_filename] = (fingerprint, cls.load_path(preset_path, preset_filename))
+                parsed_count += 1
+
+            delta = {"added": [], "removed": [], "changed": []}
+            changed = parsed_count > 0 or len(new_files) != len(files)
+            if not changed and not first_load:
+                return delta
+
+            presets = dict()
+            for _, file_presets in new_files.values():
+                if isinstance(file_presets, CsvIndex):
+                    # every key of an indexed file shares its one index
+                    presets.update(dict.fromkeys(file_presets.keys, file_presets))
+                else:
+                    presets.update(file_presets)
+            old_presets = cls._presets or dict()
+            for k, v in presets.items():
+                if k not in old_presets:
+                    delta["added"].append(k)
+                elif old_presets[k] != v:
+                    # a re-indexed file has a new index (compared by identity) and may point at edited text
+                    delta["changed"].append(k)
+            delta["removed"] = [k for k in old_presets if k not in presets]
+            cls._files = new_files
+            cls._presets = presets
+            cls._generation += 1
+
+            if changed:
+                try:
+                    cls.write_cache(new_files)
+                except OSError as e:
+                    print(f"[Prompt Helper] Failed to write preset cache '{cls.get_cache_path()}': {e}")
+            elapsed = (time.perf_counter() - start_time) * 1000
+            Stats.record(f"load_presets.{cls.__name__}", elapsed / 1000, items=parsed_count)
+            print(f"[Prompt Helper] {cls.__name__}: {len(presets)} presets from {len(new_files)} files ({parsed_count} parsed) in {elapsed:.1f}ms")
+            return delta
+
+    @classmethod
+    def load_path(cls, preset_path, preset_filename):
+        presets = dict()
+        with open(preset_path, "r", encoding="utf-8") as f:
+            cls.load_file(f, preset_filename, presets)
+        return presets
 
 
 class PresetManager(PresetManagerBase):
     csv_exts = [".csv"]
     yml_exts = [".yml", ".yaml"]
     file_extensions = [*csv_exts, *yml_exts]
+    # csv files at least this large are indexed by record offset instead of being held in memory
+    csv_index_min_bytes = 64 * 1024**2
+
+    @classmethod
+    def load_path(cls, preset_path, preset_filename):
+        if Path(preset_filename).suffix in cls.csv_exts and os.path.getsize(preset_path) >= cls.csv_index_min_bytes:
+            with open(preset_path, "rb") as f:
+                return cls.load_csv_index(f, preset_filename)
+        return super().load_path(preset_path, preset_filename)
+
+    @classmethod
+    def load_csv_index(cls, f, preset_filename) -> CsvIndex:
+        # same keys as `load_file`, with the record of each value in the file instead of the value
+        stem = Path(preset_filename).stem
+        records = iter_csv_records(f)
+        header = next(records, ([], 0, 0))[0]
+        if "name" not in header or "prompt" not in header:
+            raise ValueError(f"Preset file '{preset_filename}' needs a 'name' and a 'prompt' column.")
+        name_column = header.index("name")
+        index = CsvIndex(preset_filename, header.index("prompt"))
+        for row, offset, length in records:
+            if not row:
+                continue
+            name = row[name_column] if name_column < len(row) else None
+            index.append(f"{stem}: {name}", offset, length)
+        return index
 
     @classmethod
-    def load_file(cls, f, preset_filename):
+    def load_file(cls, f, preset_filename, presets):
         preset_file = Path(preset_filename)
         if preset_file.suffix in cls.csv_exts:
             reader = csv.DictReader(f)
             for row in reader:
-                cls._presets[f"{preset_file.stem}: {row['name']}"] = row["prompt"]
+                presets[f"{preset_file.stem}: {row['name']}"] = row["prompt"]
         elif preset_file.suffix in cls.yml_exts:
-            data = yaml.safe_load(f)
+            data = yaml.load(f, Loader=YAML_LOADER)
             if isinstance(data, list):
                 for row in data:
-                    cls._presets[f"{preset_file.stem}: {row.split(',')[0]}"] = row
+                    presets[f"{preset_file.stem}: {row.split(',')[0]}"] = row
             elif isinstance(data, dict):
                 for k, v in data.items():
                     if isinstance(v, dict):
                         for k2, v2 in v.items():
-                            cls._presets[f"{preset_file.stem}: {k}.{k2}"] = v2
+                            presets[f"{preset_file.stem}: {k}.{k2}"] = v2
                     elif isinstance(v, list):
                         for row in v:
-                            cls._presets[f"{preset_file.stem}: {k}.{row.split(',')[0]}"] = row
+                            presets[f"{preset_file.stem}: {k}.{row.split(',')[0]}"] = row
                     else:
-                        cls._presets[f"{preset_file.stem}: {k}"] = v
+                        presets[f"{preset_file.stem}: {k}"] = v
 
 
 class PresetManagerAdvanced(PresetManagerBase):
     file_extensions = [".json"]
 
     @classmethod
-    def load_file(cls, f, preset_filename):
+    def load_file(cls, f, preset_filename, presets):
         data = json.load(f)
         for k, v in data.items():
-            cls._presets[f"{Path(preset_filename).stem}: {k}"] = v
+            presets[f"{Path(preset_filename).stem}: {k}"] = v
 
     @classmethod
     def parse_preset(cls, preset):
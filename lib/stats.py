@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Stats:
+    # opt-in profiling, set PROMPT_HELPER_PROFILE=1 to record node calls and hot paths (decode, save, clip encode, preset reload).
+    # each timer keeps running totals plus the last `window` durations, percentiles are computed from that rolling window
+    enabled = os.environ.get("PROMPT_HELPER_PROFILE", "0").lower() not in ("", "0", "false")
+    window = 1024
+    quantiles = (0.5, 0.9, 0.99)
+
+    _lock = threading.Lock()
+    _timers = dict()
+    _caches = dict()
+
+    @classmethod
+    @contextmanager
+    def timer(cls, name: str, items: int = 0, nbytes: int = 0):
+        # the yielded sample can be updated inside the block, e.g. with the size of a file once it is written
+        sample = {"items": items, "bytes": nbytes}
+        if not cls.enabled:
+            yield sample
+            return
+        start_time = time.perf_counter()
+        yield sample
+        cls.record(name, time.perf_counter() - start_time, sample["items"], sample["bytes"])
+
+    @classmethod
+    def record(cls, name: str, seconds: float, items: int = 0, nbytes: int = 0):
+        if not cls.enabled:
+            return
+        with cls._lock:
+            timer = cls._timers.get(name)
+            if timer is None:
+                timer = cls._timers[name] = {"count": 0, "seconds": 0.0, "items": 0, "bytes": 0, "window": deque(maxlen=cls.window)}
+            timer["count"] += 1
+            timer["seconds"] += seconds
+            timer["items"] += items
+            timer["bytes"] += nbytes
+            timer["window"].append(seconds)
+
+    @classmethod
+    def hit(cls, name: str, hit: bool):
+        if not cls.enabled:
+            return
+        with cls._lock:
+            counts = cls._caches.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._timers.clear()
+            cls._caches.clear()
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        with cls._lock:
+            timers = {name: {**timer, "window": sorted(timer["window"])} for name, timer in cls._timers.items()}
+            caches = {name: tuple(counts) for name, counts in cls._caches.items()}
+
+        result = {"enabled": cls.enabled, "timers": dict(), "caches": dict()}
+        for name in sorted(timers):
+            timer = timers[name]
+            window = timer["window"]
+            entry = {
+                "count": timer["count"],
+                "seconds": timer["seconds"],
+                "mean": timer["seconds"] / timer["count"],
+                "max": window[-1],
+            }
+            for q in cls.quantiles:
+                entry[f"p{round(q * 100)}"] = window[min(int(q * len(window)), len(window) - 1)]
+            if timer["items"]:
+                entry["items"] = timer["items"]
+                entry["items_per_second"] = timer["items"] / timer["seconds"] if timer["seconds"] > 0 else 0.0
+            if timer["bytes"]:
+                entry["bytes"] = timer["bytes"]
+                entry["bytes_per_second"] = timer["bytes"] / timer["seconds"] if timer["seconds"] > 0 else 0.0
+            result["timers"][name] = entry
+        for name in sorted(caches):
+            hits, misses = caches[name]
+            result["caches"][name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+        return result
+
+    @classmethod
+    def to_prometheus(cls) -> str:
+        # text exposition format, timers are summaries over the rolling window and totals are counters
+        snapshot = cls.snapshot()
+        lines = ["# TYPE prompt_helper_duration_seconds summary"]
+        for name, entry in snapshot["timers"].items():
+            for q in cls.quantiles:
+                lines.append(f'prompt_helper_duration_seconds{{name="{name}",quantile="{q}"}} {entry[f"p{round(q * 100)}"]}')
+            lines.append(f'prompt_helper_duration_seconds_sum{{name="{name}"}} {entry["seconds"]}')
+            lines.append(f'prompt_helper_duration_seconds_count{{name="{name}"}} {entry["count"]}')
+        lines.append("# TYPE prompt_helper_items_total counter")
+        for name, entry in snapshot["timers"].items():
+            lines.append(f'prompt_helper_items_total{{name="{name}"}} {entry.get("items", 0)}')
+        lines.append("# TYPE prompt_helper_bytes_total counter")
+        for name, entry in snapshot["timers"].items():
+            lines.append(f'prompt_helper_bytes_total{{name="{name}"}} {entry.get("bytes", 0)}')
+        lines.append("# TYPE prompt_helper_cache_requests_total counter")
+        for name, entry in snapshot["caches"].items():
+            lines.append(f'prompt_helper_cache_requests_total{{name="{name}",result="hit"}} {entry["hits"]}')
+            lines.append(f'prompt_helper_cache_requests_total{{name="{name}",result="miss"}} {entry["misses"]}')
+        return "\n".join(lines) + "\n"
@@ -3,13 +3,22 @@
 
 import { app } from "/scripts/app.js";
 import { api } from "/scripts/api.js";
+import { ComfyWidgets } from "/scripts/widgets.js";
 
 const VALID_NODES = {
-    'PromptHelper_FormatString': ['str_', ['pattern']],
-    'PromptHelper_ConcatString': ['str_', ['separator']],
+    'PromptHelper_FormatString': ['str_', ['pattern', 'trim']],
+    'PromptHelper_ConcatString': ['str_', ['separator', 'dedupe']],
     'PromptHelper_CombineConditioning': ['cond_', []],
 };
 const VALID_NODE_TYPES = Object.keys(VALID_NODES);
+const PRESET_NODES = {
+    'PromptHelper_LoadPreset': 'PresetManager',
+    'PromptHelper_LoadPresetAdvanced': 'PresetManagerAdvanced',
+};
+const PRESET_SEARCH_LIMIT = 50;
+// prompt_N / weight_N widget pairs, the count is saved in `properties.prompt_count`
+const WEIGHTED_PROMPT_NODES = ['PromptHelper_WeightedPrompt'];
+const WEIGHTED_PROMPT_MIN_PAIRS = 3;
 
 app.registerExtension({
     name: "Comfy.PromptHelper.app",
@@ -28,6 +37,17 @@ app.registerExtension({
         }
     },
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
+        if (WEIGHTED_PROMPT_NODES.includes(nodeData.name)) {
+            const configure = nodeType.prototype.configure;
+            nodeType.prototype.configure = function (info) {
+                // create the extra pairs first, saved widget values are applied by index
+                const count = info.properties?.prompt_count ?? WEIGHTED_PROMPT_MIN_PAIRS;
+                while (countPromptPairs(this) < count) addPromptPair(this);
+                return configure.apply(this, arguments);
+            };
+            return;
+        }
+
         if (!VALID_NODE_TYPES.includes(nodeData.name)) return;
 
         const input_name = VALID_NODES[nodeData.name][0];
@@ -128,6 +148,22 @@ app.registerExtension({
     },
 
     nodeCreated(node) {
+        const manager = PRESET_NODES[node.comfyClass];
+        if (manager) {
+            const button = node.addWidget('button', 'search preset', null, () => openPresetSearch(node, manager));
+            button.serialize = false;
+            return;
+        }
+
+        if (WEIGHTED_PROMPT_NODES.includes(node.comfyClass)) {
+            node.properties.prompt_count ??= WEIGHTED_PROMPT_MIN_PAIRS;
+            const addButton = node.addWidget('button', 'add prompt', null, () => addPromptPair(node));
+            const removeButton = node.addWidget('button', 'remove prompt', null, () => removePromptPair(node));
+            addButton.serialize = false;
+            removeButton.serialize = false;
+            return;
+        }
+
         if (!VALID_NODE_TYPES.includes(node.comfyClass)) return;
 
         if (node.widgets) {
@@ -145,6 +181,38 @@ app.registerExtension({
     }
 });
 
+function countPromptPairs(node) {
+    return node.widgets?.filter((w) => /^prompt_\d+$/.test(w.name)).length ?? 0;
+}
+
+function addPromptPair(node) {
+    const n = countPromptPairs(node) + 1;
+    const start = node.widgets.length;
+    ComfyWidgets.STRING(node, `prompt_${n}`, ['STRING', { default: '', multiline: true }], app);
+    ComfyWidgets.FLOAT(node, `weight_${n}`, ['FLOAT', { default: 1.0, min: 0, max: 2, step: 0.1 }], app);
+    // keep the pair next to the others, in front of `multiplier` and the buttons
+    const added = node.widgets.splice(start);
+    const index = node.widgets.findIndex((w) => w.name === 'multiplier');
+    node.widgets.splice(index < 0 ? start : index, 0, ...added);
+    node.properties.prompt_count = n;
+    node.setSize([node.size[0], node.computeSize()[1]]);
+    app.graph.setDirtyCanvas(true, true);
+}
+
+function removePromptPair(node) {
+    const n = countPromptPairs(node);
+    if (n <= WEIGHTED_PROMPT_MIN_PAIRS) return;
+    for (const name of [`prompt_${n}`, `weight_${n}`]) {
+        const index = node.widgets.findIndex((w) => w.name === name);
+        if (index < 0) continue;
+        node.widgets[index].onRemove?.();
+        node.widgets.splice(index, 1);
+    }
+    node.properties.prompt_count = n - 1;
+    node.setSize([node.size[0], node.computeSize()[1]]);
+    app.graph.setDirtyCanvas(true, true);
+}
+
 // ref https://github.com/ltdrdata/ComfyUI-Impact-Pack/blob/Main/js/common.js
 function nodeFeedbackHandler(event) {
     let nodes = app.graph._nodes_by_id;
@@ -158,3 +226,113 @@ function nodeFeedbackHandler(event) {
 }
 
 api.addEventListener("prompt-helper-feedback", nodeFeedbackHandler);
+
+// preset search popup, queries `/prompt_helper/presets/search` page by page instead of shipping every key in a combo
+let presetSearch = null;
+
+function closePresetSearch() {
+    if (!presetSearch) return;
+    clearTimeout(presetSearch.timer);
+    document.removeEventListener('mousedown', presetSearch.onOutsideClick, true);
+    presetSearch.root.remove();
+    presetSearch = null;
+}
+
+function selectPreset(search, value) {
+    search.widget.value = value;
+    search.widget.callback?.(value);
+    app.graph.setDirtyCanvas(true);
+    closePresetSearch();
+}
+
+async function updatePresetSearch(append = false) {
+    const search = presetSearch;
+    if (!search) return;
+
+    const params = new URLSearchParams({
+        manager: search.manager,
+        q: search.input.value,
+        offset: append ? search.items.length : 0,
+        limit: PRESET_SEARCH_LIMIT,
+    });
+    try {
+        const response = await fetch(`/prompt_helper/presets/search?${params}`);
+        const data = await response.json();
+        if (presetSearch !== search) return;
+        search.items = append ? search.items.concat(data.items) : data.items;
+        search.total = data.total;
+        renderPresetSearch(search);
+    } catch (error) {
+        console.error('Error:', error);
+    }
+}
+
+function renderPresetSearch(search) {
+    search.list.replaceChildren();
+    for (const item of search.items) {
+        const row = document.createElement('div');
+        row.textContent = item;
+        row.title = item;
+        row.style.cssText = 'padding: 2px 6px; cursor: pointer; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;';
+        row.addEventListener('mouseenter', () => row.style.background = 'var(--comfy-input-bg)');
+        row.addEventListener('mouseleave', () => row.style.background = '');
+        row.addEventListener('click', () => selectPreset(search, item));
+        search.list.appendChild(row);
+    }
+    if (search.items.length < search.total) {
+        const more = document.createElement('div');
+        more.textContent = `... ${search.total - search.items.length} more`;
+        more.style.cssText = 'padding: 2px 6px; cursor: pointer; opacity: 0.6;';
+        more.addEventListener('click', () => updatePresetSearch(true));
+        search.list.appendChild(more);
+    }
+}
+
+function openPresetSearch(node, manager) {
+    closePresetSearch();
+    const widget = node.widgets.find((w) => w.name === 'preset');
+    if (!widget) return;
+
+    const root = document.createElement('div');
+    root.style.cssText = 'position: fixed; top: 20%; left: 50%; transform: translateX(-50%); width: 480px; z-index: 10000; padding: 6px; font-size: 14px; border-radius: 4px; background: var(--comfy-menu-bg); color: var(--fg-color); border: 1px solid var(--border-color);';
+    const input = document.createElement('input');
+    input.type = 'text';
+    input.value = widget.value ?? '';
+    input.placeholder = 'Search presets';
+    input.style.cssText = 'width: 100%; box-sizing: border-box; margin-bottom: 4px;';
+    const list = document.createElement('div');
+    list.style.cssText = 'max-height: 50vh; overflow-y: auto;';
+    root.append(input, list);
+    document.body.appendChild(root);
+
+    const search = { root, input, list, widget, manager, items: [], total: 0, timer: null };
+    search.onOutsideClick = (e) => {
+        if (!root.contains(e.target)) closePresetSearch();
+    };
+    document.addEventListener('mousedown', search.onOutsideClick, true);
+    input.addEventListener('input', () => {
+        clearTimeout(search.timer);
+        search.timer = setTimeout(() => updatePresetSearch(), 150);
+    });
+    input.addEventListener('keydown', (e) => {
+        if (e.key === 'Escape') {
+            closePresetSearch();
+        } else if (e.key === 'Enter' && search.items.length > 0) {
+            selectPreset(search, search.items[0]);
+        }
+    });
+    presetSearch = search;
+
+    input.focus();
+    input.select();
+    updatePresetSearch();
+}
+
+// pushed by the preset watcher in custom_server.py, refreshes an open search so it never shows stale keys
+function presetUpdateHandler(event) {
+    if (presetSearch && presetSearch.manager === event.detail.manager) {
+        updatePresetSearch();
+    }
+}
+
+api.addEventListener("prompt-helper-presets", presetUpdateHandler);